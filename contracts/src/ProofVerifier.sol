@@ -5,9 +5,15 @@ contract ProofVerifier {
     // Mapping to store proof hashes added by addresses
     mapping(address => bytes32) private proofHashes;
 
+    // Merkle roots of proof hash batches, mapped to who anchored them
+    mapping(bytes32 => address) private proofRoots;
+
     // Event for logging proof hash addition
     event ProofHashAdded(address indexed user, bytes32 proofHash);
 
+    // Event for logging a batch of proof hashes anchored under one root
+    event ProofRootAdded(address indexed submitter, bytes32 root, uint256 leafCount);
+
     // Add a proof hash for the sender
     function addProofHash(bytes32 proofHash) external {
         proofHashes[msg.sender] = proofHash;
@@ -18,4 +24,28 @@ contract ProofVerifier {
     function verifyProofHash(bytes32 proofHash) external view returns (bool) {
         return proofHashes[msg.sender] == proofHash;
     }
-}
\ No newline at end of file
+
+    // Anchor the Merkle root of a batch of proof hashes in one transaction
+    function addProofRoot(bytes32 root, uint256 leafCount) external {
+        proofRoots[root] = msg.sender;
+        emit ProofRootAdded(msg.sender, root, leafCount);
+    }
+
+    // Check that a proof hash was anchored as part of the batch with the given root.
+    // Pairs are hashed in sorted order with sha256, so the proof needs no left/right flags.
+    // Leaves and internal nodes get different prefixes (0x00 and 0x01), so an internal
+    // node with a shortened proof can't pass as a leaf.
+    function verifyInclusion(bytes32 leaf, bytes32[] calldata proof, bytes32 root) external view returns (bool) {
+        if (proofRoots[root] == address(0)) {
+            return false;
+        }
+        bytes32 node = sha256(abi.encodePacked(bytes1(0x00), leaf));
+        for (uint256 i = 0; i < proof.length; i++) {
+            bytes32 sibling = proof[i];
+            node = node < sibling
+                ? sha256(abi.encodePacked(bytes1(0x01), node, sibling))
+                : sha256(abi.encodePacked(bytes1(0x01), sibling, node));
+        }
+        return node == root;
+    }
+}
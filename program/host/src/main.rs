@@ -3,60 +3,211 @@
 use methods::{
     PROGRAM_ELF, PROGRAM_ID
 };
-use risc0_zkvm::{default_prover, ExecutorEnv};
+use risc0_zkvm::{default_prover, ExecutorEnv, Prover, Receipt};
+use serde::{Deserialize, Serialize};
 use sha2::{Digest, Sha256};
 use std::env;
+use std::fmt::Write as _;
+use std::io::{self, BufRead, Write};
+
+#[derive(Deserialize)]
+struct Trade {
+    entry: f32,
+    current: f32,
+    pnl: f32,
+    lev: u32,
+}
+
+// One line of JSON on stdin in `--serve` mode. All trades are proven together.
+// With `verify` set to a hex receipt instead, that receipt is checked against
+// PROGRAM_ID and its journal returned without proving anything.
+#[derive(Deserialize)]
+struct Request {
+    id: u64,
+    #[serde(default)]
+    trades: Vec<Trade>,
+    // Receipts are large, so only send them back when asked
+    #[serde(default)]
+    receipt: bool,
+    #[serde(default)]
+    verify: Option<String>,
+}
+
+// What the guest commits: the flattened inputs and one pass/fail entry per trade
+type Journal = (Vec<f32>, Vec<bool>);
+
+// One line of JSON on stdout in `--serve` mode.
+// status is "ok" with one pass/fail entry per trade, or "error".
+#[derive(Serialize)]
+struct Response {
+    id: u64,
+    status: &'static str,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    results: Option<Vec<bool>>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    proof_hash: Option<String>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    journal: Option<String>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    receipt: Option<String>,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    error: Option<String>,
+}
+
+fn to_hex(bytes: &[u8]) -> String {
+    let mut s = String::with_capacity(bytes.len() * 2);
+    for b in bytes {
+        write!(s, "{:02x}", b).unwrap();
+    }
+    s
+}
+
+fn from_hex(s: &str) -> anyhow::Result<Vec<u8>> {
+    // Byte by byte: slicing the str could split a multi-byte char and panic
+    let s = s.as_bytes();
+    anyhow::ensure!(s.len() % 2 == 0, "odd-length hex");
+    let digit = |b: u8| (b as char).to_digit(16).ok_or_else(|| anyhow::anyhow!("invalid hex digit"));
+    s.chunks(2)
+        .map(|pair| Ok((digit(pair[0])? * 16 + digit(pair[1])?) as u8))
+        .collect()
+}
+
+fn proof_hash(receipt: &Receipt) -> String {
+    let mut hasher = Sha256::new();
+    hasher.update(&receipt.journal.bytes);
+    format!("{:x}", hasher.finalize())
+}
+
+fn prove(prover: &dyn Prover, trades: &[Trade]) -> anyhow::Result<Receipt> {
+    let inputs: Vec<f32> = trades
+        .iter()
+        .flat_map(|t| [t.entry, t.current, t.pnl, (t.lev as f32)])
+        .collect();
+
+    let env = ExecutorEnv::builder()
+        .write(&inputs)?
+        .build()?;
+
+    // Proof information by proving the specified ELF binary.
+    // This struct contains the receipt along with statistics about execution of the guest
+    let prove_info = prover.prove(env, PROGRAM_ELF)?;
+
+    // The receipt was verified at the end of proving, but the below code is an
+    // example of how someone else could verify this receipt.
+    prove_info.receipt.verify(PROGRAM_ID)?;
+
+    Ok(prove_info.receipt)
+}
+
+// Check a receipt another machine produced, e.g. a remote prover worker
+fn verify(hex: &str) -> anyhow::Result<Receipt> {
+    let receipt: Receipt = bincode::deserialize(&from_hex(hex)?)?;
+    receipt.verify(PROGRAM_ID)?;
+    Ok(receipt)
+}
+
+fn handle(prover: &dyn Prover, line: &str) -> Response {
+    let error = |id, msg: String| Response {
+        id, status: "error", results: None, proof_hash: None, journal: None, receipt: None, error: Some(msg),
+    };
+
+    // Take the id before decoding the rest, so a job that doesn't fit Request
+    // (say a leverage too big for u32) fails on its own id instead of
+    // leaving the client waiting on it until the timeout
+    let value: serde_json::Value = match serde_json::from_str(line) {
+        Ok(value) => value,
+        Err(e) => return error(0, e.to_string()),
+    };
+    let id = value.get("id").and_then(serde_json::Value::as_u64).unwrap_or(0);
+    let req: Request = match serde_json::from_value(value) {
+        Ok(req) => req,
+        Err(e) => return error(id, e.to_string()),
+    };
+
+    let receipt = match &req.verify {
+        Some(hex) => verify(hex),
+        None => prove(prover, &req.trades),
+    };
+    let receipt = match receipt {
+        Ok(receipt) => receipt,
+        Err(e) => return error(req.id, e.to_string()),
+    };
+    let results = match receipt.journal.decode::<Journal>() {
+        Ok((_, results)) => results,
+        Err(e) => return error(req.id, e.to_string()),
+    };
+    let encoded = if req.receipt {
+        bincode::serialize(&receipt).map(|b| to_hex(&b)).ok()
+    } else {
+        None
+    };
+
+    Response {
+        id: req.id,
+        status: "ok",
+        results: Some(results),
+        proof_hash: Some(proof_hash(&receipt)),
+        journal: Some(to_hex(&receipt.journal.bytes)),
+        receipt: encoded,
+        error: None,
+    }
+}
+
+// Keep one prover warm and answer newline-delimited JSON jobs until stdin closes.
+fn serve() {
+    let prover = default_prover();
+    let stdin = io::stdin();
+    let mut stdout = io::stdout().lock();
+
+    for line in stdin.lock().lines() {
+        let line = match line {
+            Ok(line) => line,
+            Err(_) => break,
+        };
+        if line.trim().is_empty() {
+            continue;
+        }
+        let response = handle(prover.as_ref(), &line);
+        serde_json::to_writer(&mut stdout, &response).unwrap();
+        stdout.write_all(b"\n").unwrap();
+        stdout.flush().unwrap();
+    }
+}
 
 fn main() {
     // Initialize tracing. In order to view logs, run `RUST_LOG=info cargo run`
+    // Logs go to stderr so stdout stays clean for `--serve` responses.
     tracing_subscriber::fmt()
         .with_env_filter(tracing_subscriber::filter::EnvFilter::from_default_env())
+        .with_writer(io::stderr)
         .init();
 
     let args: Vec<String> = env::args().collect();
 
+    if args.len() > 1 && args[1] == "--serve" {
+        serve();
+        return;
+    }
 
     // For example:
     let entry: f32 = args[1].parse().expect("Invalid number for entry");
     let current: f32 = args[2].parse().expect("Invalid number for current");
     let pnl: f32 = args[3].parse().expect("Invalid number for pnl");
     let lev: u32 = args[4].parse().expect("Invalid number for lev");
-    let inputs = vec![entry, current, pnl, (lev as f32)];
-    
-
-    let env = ExecutorEnv::builder()
-        .write(&inputs)
-        .unwrap()
-        .build()
-        .unwrap();
 
     // Obtain the default prover.
     let prover = default_prover();
 
-    // Proof information by proving the specified ELF binary.
-    // This struct contains the receipt along with statistics about execution of the guest
-    let prove_info = prover
-        .prove(env, PROGRAM_ELF)
-        .unwrap();
-
     // extract the receipt.
-    let receipt = prove_info.receipt;
+    let receipt = prove(prover.as_ref(), &[Trade { entry, current, pnl, lev }]).unwrap();
 
-    // TODO: Implement code for retrieving receipt journal here.
+    // The journal holds the inputs and one pass/fail entry per trade
+    let (_, output): Journal = receipt.journal.decode().unwrap();
 
-    // For example:
-    let output: bool = receipt.journal.decode().unwrap();
+    println!("output: {}", output[0]);
+    println!("proof hash: {}", proof_hash(&receipt));
 
-    println!("output: {}", output);
-
-    let mut hasher = Sha256::new();
-    let data = &receipt.journal.bytes;
-    hasher.update(data);
-    println!("proof hash: {:x}", hasher.finalize());
-
-    // The receipt was verified at the end of proving, but the below code is an
-    // example of how someone else could verify this receipt.
-    receipt
-        .verify(PROGRAM_ID)
-        .unwrap();
+    if !output[0] {
+        std::process::exit(1);
+    }
 }
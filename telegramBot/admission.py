@@ -0,0 +1,81 @@
+import os
+import time
+
+# Screenshots a user may send per minute, and how many in a quick burst
+ADMISSION_USER_PER_MINUTE = float(os.getenv('ADMISSION_USER_PER_MINUTE', '6'))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', '3'))
+# Same for a whole chat, so a group can't flood us through many accounts
+ADMISSION_CHAT_PER_MINUTE = float(os.getenv('ADMISSION_CHAT_PER_MINUTE', '30'))
+ADMISSION_CHAT_BURST = float(os.getenv('ADMISSION_CHAT_BURST', '10'))
+
+# Full buckets are dropped every this many checks to keep memory bounded
+SWEEP_EVERY = 1000
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self):
+        """Seconds until a token is available, 0 if one is."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class Admission:
+    """Per-user and per-chat token buckets in front of the pipeline.
+
+    check() spends a token from both buckets or neither, and tells the caller
+    whether this is the first rejection since the user was last let in, so
+    a spammer gets one "slow down" instead of one per screenshot.
+    """
+
+    def __init__(self, user_per_minute=ADMISSION_USER_PER_MINUTE, user_burst=ADMISSION_USER_BURST,
+                 chat_per_minute=ADMISSION_CHAT_PER_MINUTE, chat_burst=ADMISSION_CHAT_BURST):
+        self.user_limits = (user_per_minute / 60, user_burst)
+        self.chat_limits = (chat_per_minute / 60, chat_burst)
+        self._users = {}
+        self._chats = {}
+        self._warned = set()
+        self._checks = 0
+
+    def _bucket(self, buckets, key, limits, now):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(*limits, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def check(self, user_id, chat_id):
+        """Return (retry_after, scope, first_rejection); retry_after is 0 when admitted."""
+        now = time.monotonic()
+        self._checks += 1
+        if self._checks % SWEEP_EVERY == 0:
+            self._sweep(now)
+
+        user = self._bucket(self._users, user_id, self.user_limits, now)
+        chat = self._bucket(self._chats, chat_id, self.chat_limits, now)
+        user_wait, chat_wait = user.wait(), chat.wait()
+        if not user_wait and not chat_wait:
+            user.tokens -= 1
+            chat.tokens -= 1
+            self._warned.discard(user_id)
+            return 0.0, None, False
+
+        scope = "user" if user_wait >= chat_wait else "chat"
+        first = user_id not in self._warned
+        self._warned.add(user_id)
+        return max(user_wait, chat_wait), scope, first
+
+    def _sweep(self, now):
+        for buckets in (self._users, self._chats):
+            for key in [k for k, b in buckets.items() if b.tokens + (now - b.updated) * b.rate >= b.burst]:
+                del buckets[key]
+        self._warned &= set(self._users)
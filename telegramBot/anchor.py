@@ -0,0 +1,146 @@
+import os
+import asyncio
+import hashlib
+import logging
+from rpc import contract_address, post_root_to_sc, proof_leaf, resync_nonce, tx_hex, tx_link
+
+logger = logging.getLogger(__name__)
+
+# Proof hashes that arrive within the window share one on-chain root, up to the batch size
+ANCHOR_WINDOW = float(os.getenv('ANCHOR_WINDOW', '5'))
+ANCHOR_MAX_BATCH = int(os.getenv('ANCHOR_MAX_BATCH', '256'))
+
+
+# Domain tags so a leaf can never be passed off as an internal node or vice
+# versa; must match ProofVerifier.verifyInclusion
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def hash_leaf(leaf: bytes) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + leaf).digest()
+
+
+def hash_pair(a: bytes, b: bytes) -> bytes:
+    # Sorted so proofs don't need left/right flags
+    return hashlib.sha256(NODE_PREFIX + min(a, b) + max(a, b)).digest()
+
+
+class MerkleTree:
+    """Sorted-pair sha256 Merkle tree over 32-byte leaves.
+
+    Leaves are hashed as sha256(0x00 || leaf) and internal nodes as
+    sha256(0x01 || min || max). An odd node at the end of a level is carried
+    up unchanged, so it simply contributes no sibling to the proofs that pass
+    through it.
+    """
+
+    def __init__(self, leaves):
+        self.levels = [[hash_leaf(leaf) for leaf in leaves]]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0]
+
+    def proof(self, index):
+        """Sibling hashes from leaf `index` up to the root."""
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append(level[sibling])
+            index //= 2
+        return proof
+
+    @staticmethod
+    def verify(leaf, proof, root):
+        node = hash_leaf(leaf)
+        for sibling in proof:
+            node = hash_pair(node, sibling)
+        return node == root
+
+
+class Anchorer:
+    """Collects proof hashes and anchors each batch on chain as a single Merkle root."""
+
+    def __init__(self, window=ANCHOR_WINDOW, max_batch=ANCHOR_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        if not contract_address:
+            # Every anchoring tx would revert against a contract without addProofRoot
+            raise RuntimeError("CONTRACT_ADDRESS must be set to a ProofVerifier deployment with addProofRoot")
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def resync(self):
+        """Recount the sender's nonce from the chain, e.g. after a root tx never got mined."""
+        await resync_nonce()
+
+    def submit(self, proof_hash):
+        """Queue a proof hash. The future resolves as soon as the root tx is sent,
+        to a dict with the tx hash, explorer link, the batch root and this
+        leaf's inclusion proof (hex)."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((proof_hash, future))
+        return future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            # A proof hash identifies a batch proof, not one trade, so several
+            # users can map to one leaf
+            positions = {}
+            for proof_hash, _ in batch:
+                positions.setdefault(proof_leaf(proof_hash), len(positions))
+            leaves = list(positions)
+            tree = MerkleTree(leaves)
+            try:
+                tx_hash = await post_root_to_sc(tree.root, len(leaves))
+            except Exception as e:
+                logger.error(f"Anchoring {len(leaves)} proof hashes failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            link = tx_link(tx_hash)
+            logger.info(f"Sent root 0x{tree.root.hex()} for {len(leaves)} proof hashes: {link}")
+            for proof_hash, future in batch:
+                if future.done():
+                    continue
+                index = positions[proof_leaf(proof_hash)]
+                future.set_result({
+                    "tx_hash": tx_hex(tx_hash),
+                    "link": link,
+                    "root": "0x" + tree.root.hex(),
+                    "proof": ["0x" + node.hex() for node in tree.proof(index)],
+                })
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Stand-in for `host --serve` that answers the same NDJSON protocol without proving.
+
+Each request sleeps FAKE_PROVE_SECONDS plus FAKE_PROVE_PER_TRADE per trade,
+one at a time like the real daemon, and judges trades with the same f32 check
+the guest runs. Journals are encoded like the guest's, and the "receipt"
+is the journal itself, which `{"verify": ...}` requests decode back.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rpc import precheck_pnl
+from prover_client import encode_journal, decode_journal
+
+FAKE_PROVE_SECONDS = float(os.getenv('FAKE_PROVE_SECONDS', '1.0'))
+FAKE_PROVE_PER_TRADE = float(os.getenv('FAKE_PROVE_PER_TRADE', '0.05'))
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "--serve":
+        sys.exit("fake_host only supports --serve")
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            print(json.dumps({"id": 0, "status": "error", "error": str(e)}), flush=True)
+            continue
+
+        if "verify" in request:
+            # The fake receipt is just the journal
+            journal = request["verify"]
+            try:
+                _, results = decode_journal(journal)
+            except ValueError as e:
+                print(json.dumps({"id": request["id"], "status": "error", "error": str(e)}), flush=True)
+                continue
+        else:
+            trades = request["trades"]
+            time.sleep(FAKE_PROVE_SECONDS + FAKE_PROVE_PER_TRADE * len(trades))
+            results = [precheck_pnl(t["entry"], t["current"], t["pnl"], t["lev"]) for t in trades]
+            inputs = [t[k] for t in trades for k in ("entry", "current", "pnl", "lev")]
+            journal = encode_journal(inputs, results)
+        response = {
+            "id": request["id"],
+            "status": "ok",
+            "results": results,
+            "proof_hash": hashlib.sha256(bytes.fromhex(journal)).hexdigest(),
+            "journal": journal,
+        }
+        if request.get("receipt"):
+            response["receipt"] = journal
+        print(json.dumps(response), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Local stand-ins for the Telegram Bot API, the OpenAI API and a JSON-RPC chain.
+
+All three are served by one aiohttp app so the benchmark runs offline:
+  /bot<token>/<method>        Telegram Bot API
+  /file/bot<token>/<path>     Telegram file downloads
+  /v1/chat/completions        OpenAI chat completions
+  /rpc                        Ethereum JSON-RPC (only what the bot uses)
+Every endpoint sleeps its configured latency, with +-50% jitter.
+"""
+import json
+import time
+import random
+import asyncio
+import hashlib
+from aiohttp import web
+
+CHAIN_ID = 31337
+
+
+def jittered(seconds):
+    return seconds * random.uniform(0.5, 1.5) if seconds else 0
+
+
+def trade_for(key: bytes, fake_ratio):
+    """A deterministic trade per image; fake_ratio of them have an impossible PnL."""
+    digest = hashlib.sha256(key).digest()
+    entry = 100 + int.from_bytes(digest[:4], "big") % 1000000 / 100
+    move = (digest[4] / 255 - 0.3) / 10
+    leverage = 1 + digest[5] % 20
+    exit_price = round(entry * (1 + move), 2)
+    percentage = round((exit_price - entry) / entry * 100 * leverage, 2)
+    if digest[6] / 255 < fake_ratio:
+        percentage = round(percentage * 3 + 50, 2)
+    return {"entry": entry, "exit": exit_price, "percentage": percentage, "leverage": leverage}
+
+
+class Fakes:
+    def __init__(self, telegram_latency=0.05, openai_latency=1.5, rpc_latency=0.05, block_time=2.0,
+                 fake_ratio=0.2):
+        self.telegram_latency = telegram_latency
+        self.openai_latency = openai_latency
+        self.rpc_latency = rpc_latency
+        self.block_time = block_time
+        self.fake_ratio = fake_ratio
+        self.files = {}
+        self.counts = {}
+        self._message_id = 0
+        self._transactions = {}
+        self._nonce = 0
+        self._block = 1
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.app.router.add_post(r"/bot{token}/{method}", self.telegram)
+        self.app.router.add_get(r"/file/bot{token}/{path:.+}", self.telegram_file)
+        self.app.router.add_post("/v1/chat/completions", self.openai)
+        self.app.router.add_post("/rpc", self.rpc)
+        self._runner = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    # Telegram
+
+    def _message(self, chat_id, text):
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "text": text,
+        }
+
+    async def telegram(self, request):
+        method = request.match_info["method"]
+        self._count(f"telegram.{method}")
+        params = dict(await request.post()) if request.can_read_body else {}
+        await asyncio.sleep(jittered(self.telegram_latency))
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "sendMessage":
+            result = self._message(int(params["chat_id"]), params.get("text", ""))
+        elif method == "editMessageText":
+            result = self._message(int(params["chat_id"]), params.get("text", ""))
+            result["message_id"] = int(params["message_id"])
+        elif method == "getFile":
+            file_id = params["file_id"]
+            result = {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": len(self.files.get(file_id, b"")),
+                "file_path": f"photos/{file_id}.jpg",
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def telegram_file(self, request):
+        self._count("telegram.download")
+        file_id = request.match_info["path"].rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        await asyncio.sleep(jittered(self.telegram_latency))
+        if file_id not in self.files:
+            raise web.HTTPNotFound()
+        return web.Response(body=self.files[file_id], content_type="image/jpeg")
+
+    # OpenAI
+
+    async def openai(self, request):
+        self._count("openai.chat")
+        body = await request.json()
+        image_url = next(
+            part["image_url"]["url"]
+            for part in body["messages"][0]["content"]
+            if part["type"] == "image_url"
+        )
+        await asyncio.sleep(jittered(self.openai_latency))
+        content = json.dumps(trade_for(image_url.encode(), self.fake_ratio))
+        return web.json_response({
+            "id": f"chatcmpl-{self.counts['openai.chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 850, "completion_tokens": 30, "total_tokens": 880},
+        })
+
+    # Chain
+
+    def _rpc_result(self, method, params):
+        self._count(f"rpc.{method}")
+        if method == "eth_chainId":
+            return hex(CHAIN_ID)
+        if method == "eth_getTransactionCount":
+            return hex(self._nonce)
+        if method == "eth_gasPrice":
+            return hex(10 ** 9)
+        if method == "eth_estimateGas":
+            return hex(60000)
+        if method == "eth_blockNumber":
+            return hex(self._block)
+        if method == "web3_clientVersion":
+            return "bench/fake-chain"
+        if method == "eth_call":
+            return "0x" + "00" * 32
+        if method == "eth_sendRawTransaction":
+            tx_hash = "0x" + hashlib.sha256(params[0].encode()).hexdigest()
+            self._nonce += 1
+            self._transactions[tx_hash] = time.time() + jittered(self.block_time)
+            return tx_hash
+        if method == "eth_getTransactionReceipt":
+            mined_at = self._transactions.get(params[0])
+            if mined_at is None or time.time() < mined_at:
+                return None
+            self._block += 1
+            return {
+                "transactionHash": params[0],
+                "status": "0x1",
+                "blockNumber": hex(self._block),
+                "gasUsed": hex(60000),
+                "effectiveGasPrice": hex(10 ** 9),
+            }
+        raise ValueError(f"method {method} not supported by the fake chain")
+
+    def _rpc_response(self, call):
+        try:
+            return {"jsonrpc": "2.0", "id": call.get("id"), "result": self._rpc_result(call["method"], call.get("params", []))}
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": call.get("id"), "error": {"code": -32601, "message": str(e)}}
+
+    async def rpc(self, request):
+        body = await request.json()
+        await asyncio.sleep(jittered(self.rpc_latency))
+        if isinstance(body, list):
+            return web.json_response([self._rpc_response(call) for call in body])
+        return web.json_response(self._rpc_response(body))
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""End-to-end load test of the bot against local fakes.
+
+Synthetic photo Updates go through the real handlers, pipeline, prover pool,
+anchorer and receipt tracker. Telegram and OpenAI are faked (see fakes.py),
+the prover is bench/fake_host.py unless --host points at a real `host`
+(run locally, or on --farm-workers prover_worker.py processes), and
+the chain is a fake JSON-RPC endpoint unless --anvil starts anvil and deploys
+ProofVerifier with forge.
+
+    cd telegramBot && python bench/run.py --concurrency 1,8,32 --requests 100
+
+Reports throughput and p50/p95/p99 per stage for each concurrency level. The
+bot's own settings (PROVER_WORKERS, ANCHOR_WINDOW, RECEIPT_POLL_INTERVAL, ...)
+are read from the environment as usual, so changes can be compared run to run.
+The contract ABI must be built (`forge build` in contracts/) in both modes.
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+bot_dir = os.path.dirname(bench_dir)
+contracts_dir = os.path.join(os.path.dirname(bot_dir), "contracts")
+sys.path.insert(0, bot_dir)
+
+from fakes import Fakes, CHAIN_ID
+
+# anvil's first dev account
+ANVIL_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+ANVIL_PORT = 8545
+FARM_PORT = 7000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated in-flight job counts")
+    parser.add_argument("--requests", type=int, default=50, help="jobs per concurrency level")
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--openai-latency", type=float, default=1.5)
+    parser.add_argument("--rpc-latency", type=float, default=0.05)
+    parser.add_argument("--block-time", type=float, default=2.0, help="fake chain only")
+    parser.add_argument("--fake-ratio", type=float, default=0.2, help="share of screenshots with a made up PnL")
+    parser.add_argument("--host", help="real prover executable instead of fake_host.py")
+    parser.add_argument("--farm-workers", type=int, default=0,
+                        help="prove on this many local prover_worker.py processes through the farm instead")
+    parser.add_argument("--anvil", action="store_true", help="use a local anvil chain with ProofVerifier deployed")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for one job")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+def start_anvil():
+    anvil = subprocess.Popen(["anvil", "--port", str(ANVIL_PORT), "--silent"])
+    rpc_url = f"http://127.0.0.1:{ANVIL_PORT}"
+    for _ in range(50):
+        probe = subprocess.run(["cast", "chain-id", "--rpc-url", rpc_url], capture_output=True)
+        if probe.returncode == 0:
+            break
+        time.sleep(0.1)
+    deploy = subprocess.run(
+        ["forge", "create", "src/ProofVerifier.sol:ProofVerifier",
+         "--rpc-url", rpc_url, "--private-key", ANVIL_KEY, "--broadcast"],
+        cwd=contracts_dir, capture_output=True, text=True, check=True,
+    )
+    address = re.search(r"Deployed to: (0x[0-9a-fA-F]{40})", deploy.stdout).group(1)
+    return anvil, rpc_url, address
+
+
+def configure(args, url, workdir):
+    """Point the bot at the fakes. Must run before the bot modules are imported."""
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["CACHE_PATH"] = os.path.join(workdir, "cache.sqlite3")
+    os.environ["JOBS_PATH"] = os.path.join(workdir, "jobs.sqlite3")
+    os.environ["PROVER_EXE"] = args.host or os.path.join(bench_dir, "fake_host.py")
+    # Synthetic images have no text, so OCR would only add noise
+    os.environ.setdefault("OCR_ENABLED", "0")
+    if args.farm_workers:
+        os.environ.update(PROVER_WORKERS="0", PROVER_FARM_PORT=str(FARM_PORT), PROVER_FARM_TOKEN="bench")
+    anvil = None
+    if args.anvil:
+        anvil, rpc_url, address = start_anvil()
+        os.environ.update(RPC_URLS=rpc_url, CONTRACT_ADDRESS=address, SENDER_PK=ANVIL_KEY)
+    else:
+        os.environ.update(
+            RPC_URLS=f"{url}/rpc",
+            CONTRACT_ADDRESS="0x5FbDB2315678afecb367f032d93F642f64180aa3",
+            SENDER_PK=ANVIL_KEY,
+        )
+    os.environ["CHAIN_ID"] = str(CHAIN_ID)
+    return anvil
+
+
+def start_farm_workers(count, exe):
+    env = dict(os.environ, PROVER_FARM_ADDR=f"127.0.0.1:{FARM_PORT}", PROVER_EXE=exe)
+    return [
+        subprocess.Popen([sys.executable, os.path.join(bot_dir, "prover_worker.py")],
+                         env=dict(env, PROVER_WORKER_NAME=f"bench-{i}"))
+        for i in range(count)
+    ]
+
+
+def synthetic_photo(seed):
+    """A distinct JPEG per job, so no cache or look-alike match kicks in."""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    image = Image.new("RGB", (720, 1280), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(720), rng.randrange(1280)
+        draw.rectangle((x, y, x + rng.randrange(40, 300), y + rng.randrange(20, 200)),
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+class Recorder:
+    """Collects per-stage durations by wrapping the pipeline's stage methods."""
+
+    def __init__(self, bot, stages):
+        self.samples = {}
+        self.verdicts = {}
+        self.done = {}
+        self._created = {}
+        pipeline = bot.pipeline
+
+        for stage in stages:
+            setattr(pipeline, f"_{stage}", self._timed(stage, getattr(pipeline, f"_{stage}")))
+
+        submit = pipeline.submit
+        def timed_submit(job):
+            job["_queued_at"] = time.perf_counter()
+            submit(job)
+        pipeline.submit = timed_submit
+
+        create = bot.job_store.create
+        def timed_create(*args):
+            job = create(*args)
+            self._created[job["id"]] = time.perf_counter()
+            return job
+        bot.job_store.create = timed_create
+
+        finish = bot.job_store.finish
+        def timed_finish(job):
+            finish(job)
+            self.add("total", time.perf_counter() - self._created.pop(job["id"]))
+            verdict = job["data"].get("verdict", "error")
+            self.verdicts[verdict] = self.verdicts.get(verdict, 0) + 1
+            future = self.done.pop(job["file_unique_id"], None)
+            if future and not future.done():
+                future.set_result(verdict)
+        bot.job_store.finish = timed_finish
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def _timed(self, stage, method):
+        async def timed(job):
+            started = time.perf_counter()
+            self.add(f"{stage} queued", started - job.pop("_queued_at", started))
+            try:
+                return await method(job)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        return timed
+
+    def reset(self):
+        self.samples = {}
+        self.verdicts = {}
+
+
+async def run_level(application, fakes, recorder, concurrency, requests, timeout, offset):
+    from telegram import Update
+    recorder.reset()
+    slots = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def one(n):
+        file_id = f"bench-{offset + n}"
+        fakes.files[file_id] = await asyncio.to_thread(synthetic_photo, offset + n)
+        chat_id = 1000 + offset + n
+        update = Update.de_json({
+            "update_id": offset + n,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "bench"},
+                "photo": [{"file_id": file_id, "file_unique_id": file_id, "width": 720, "height": 1280}],
+            },
+        }, application.bot)
+        async with slots:
+            finished = recorder.done[file_id] = loop.create_future()
+            started = time.perf_counter()
+            await application.process_update(update)
+            recorder.add("handler", time.perf_counter() - started)
+            try:
+                await asyncio.wait_for(finished, timeout)
+            except asyncio.TimeoutError:
+                recorder.verdicts["timed out"] = recorder.verdicts.get("timed out", 0) + 1
+            finally:
+                recorder.done.pop(file_id, None)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_seconds": wall,
+        "throughput": requests / wall,
+        "verdicts": dict(recorder.verdicts),
+        "stages": {
+            name: {
+                "count": len(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99),
+            }
+            for name, samples in recorder.samples.items()
+        },
+    }
+
+
+def report(result, stage_order):
+    print(f"\nconcurrency={result['concurrency']} requests={result['requests']} "
+          f"wall={result['wall_seconds']:.1f}s throughput={result['throughput']:.2f} jobs/s")
+    print("verdicts: " + ", ".join(f"{k}={v}" for k, v in sorted(result["verdicts"].items())))
+    print(f"{'stage':<22}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    names = ["handler"] + [n for s in stage_order for n in (f"{s} queued", s)] + ["total"]
+    for name in names:
+        stats = result["stages"].get(name)
+        if stats:
+            print(f"{name:<22}{stats['count']:>7}{stats['p50'] * 1000:>11.1f}"
+                  f"{stats['p95'] * 1000:>11.1f}{stats['p99'] * 1000:>11.1f}")
+
+
+async def main():
+    args = parse_args()
+    fakes = Fakes(args.telegram_latency, args.openai_latency, args.rpc_latency, args.block_time, args.fake_ratio)
+    url = await fakes.start()
+    workdir = tempfile.mkdtemp(prefix="zkpnl-bench-")
+    anvil = configure(args, url, workdir)
+
+    # Imported only now so they pick up the settings above
+    from telegram.ext import Application
+    import telegramBot as bot
+    from pipeline import STAGES
+
+    application = bot.build_application(
+        Application.builder().token("1:bench").base_url(f"{url}/bot").base_file_url(f"{url}/file/bot")
+    )
+    await application.initialize()
+    await bot.post_init(application)
+    recorder = Recorder(bot, STAGES)
+    farm_workers = start_farm_workers(args.farm_workers, os.environ["PROVER_EXE"])
+    while bot.prover_pool.capacity < args.farm_workers:
+        await asyncio.sleep(0.1)
+
+    results = []
+    try:
+        offset = 0
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            result = await run_level(application, fakes, recorder, concurrency, args.requests, args.timeout, offset)
+            offset += args.requests
+            report(result, STAGES)
+            results.append(result)
+    finally:
+        await bot.post_shutdown(application)
+        await application.shutdown()
+        await fakes.stop()
+        for worker in farm_workers:
+            worker.terminate()
+        if anvil:
+            anvil.terminate()
+
+    print("\nfake endpoint calls: " + ", ".join(f"{k}={v}" for k, v in sorted(fakes.counts.items())))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import logging
+from phash import HashIndex
+
+logger = logging.getLogger(__name__)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv('CACHE_PATH', os.path.join(script_dir, "pnl_cache.sqlite3"))
+# Seconds a cached verdict stays valid
+CACHE_TTL = float(os.getenv('CACHE_TTL', str(7 * 24 * 3600)))
+# Least recently used entries are dropped past this many images
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '100000'))
+# Hamming distance (out of PHASH_SIZE**2 bits) at which two images count as look-alikes
+PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', '12'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    image_sha256 TEXT PRIMARY KEY,
+    trade_data TEXT NOT NULL,
+    proof_hash TEXT,
+    proof_link TEXT,
+    anchor TEXT,
+    phash TEXT,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS file_ids (
+    file_unique_id TEXT PRIMARY KEY,
+    image_sha256 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS file_ids_image ON file_ids (image_sha256);
+"""
+
+def image_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class ResultCache:
+    """SQLite cache of verdicts keyed by image SHA-256 and Telegram file_unique_id.
+
+    A hit is a dict with trade_data, proof_hash, proof_link and anchor (the
+    Merkle root and inclusion proof). proof_hash is None for trades that failed
+    verification.
+
+    Perceptual hashes of cached images are kept in an in-memory HashIndex,
+    so recompressed, resized or cropped reposts can be matched too.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 max_distance=PHASH_MAX_DISTANCE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._migrate()
+        self._load_index()
+
+    def _migrate(self):
+        # Older caches lack the anchor and phash columns
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(results)")]
+        with self.db:
+            if "anchor" not in columns:
+                self.db.execute("ALTER TABLE results ADD COLUMN anchor TEXT")
+            if "phash" not in columns:
+                self.db.execute("ALTER TABLE results ADD COLUMN phash TEXT")
+
+    def _load_index(self):
+        # Only at startup; after that every put and delete updates the index in place
+        self.index = HashIndex(self.max_distance)
+        for image_sha256, phash in self.db.execute(
+            "SELECT image_sha256, phash FROM results WHERE phash IS NOT NULL"
+        ):
+            self.index.add(phash, image_sha256)
+
+    def get_by_file_id(self, file_unique_id):
+        row = self.db.execute(
+            "SELECT image_sha256 FROM file_ids WHERE file_unique_id = ?", (file_unique_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return self.get_by_hash(row[0])
+
+    def get_by_hash(self, image_sha256):
+        row = self.db.execute(
+            "SELECT trade_data, proof_hash, proof_link, anchor, created_at FROM results WHERE image_sha256 = ?",
+            (image_sha256,)
+        ).fetchone()
+        if not row:
+            return None
+        now = time.time()
+        if now - row[4] > self.ttl:
+            self.delete(image_sha256)
+            return None
+        with self.db:
+            self.db.execute("UPDATE results SET last_used = ? WHERE image_sha256 = ?", (now, image_sha256))
+        return {
+            "trade_data": json.loads(row[0]),
+            "proof_hash": row[1],
+            "proof_link": row[2],
+            "anchor": json.loads(row[3]) if row[3] else None,
+        }
+
+    async def get_similar(self, phash):
+        """Nearest cached image within the distance limit, as (image_sha256, hit)."""
+        # The search is CPU work that grows with the cache, so it runs off the
+        # event loop; the SQLite reads stay on it with every other query
+        matches = await asyncio.to_thread(self.index.search, phash)
+        for d, image_sha256 in matches:
+            cached = self.get_by_hash(image_sha256)
+            if cached:
+                logger.info(f"Perceptual match for {image_sha256} at distance {d}")
+                return image_sha256, cached
+        return None, None
+
+    def add_file_id(self, file_unique_id, image_sha256):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO file_ids (file_unique_id, image_sha256) VALUES (?, ?)",
+                (file_unique_id, image_sha256)
+            )
+
+    def put(self, image_sha256, file_unique_id, trade_data, proof_hash=None, proof_link=None, anchor=None,
+            phash=None):
+        """Store a verdict. A None proof_hash records a trade the guest rejected,
+        so never call this for a proof that failed to run."""
+        now = time.time()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results "
+                "(image_sha256, trade_data, proof_hash, proof_link, anchor, phash, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (image_sha256, json.dumps(trade_data), proof_hash, proof_link,
+                 json.dumps(anchor) if anchor else None, phash, now, now)
+            )
+            if file_unique_id:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO file_ids (file_unique_id, image_sha256) VALUES (?, ?)",
+                    (file_unique_id, image_sha256)
+                )
+        if phash:
+            self.index.add(phash, image_sha256)
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over the size limit."""
+        cutoff = time.time() - self.ttl
+        with self.db:
+            # Selected first so the same keys can come out of the index
+            expired = [row[0] for row in self.db.execute(
+                "SELECT image_sha256 FROM results WHERE created_at < ?", (cutoff,)
+            )]
+            evicted = [row[0] for row in self.db.execute(
+                "SELECT image_sha256 FROM results WHERE created_at >= ? "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (cutoff, self.max_entries)
+            )]
+            if expired or evicted:
+                self.db.executemany(
+                    "DELETE FROM results WHERE image_sha256 = ?", [(key,) for key in expired + evicted]
+                )
+                self.db.execute(
+                    "DELETE FROM file_ids WHERE image_sha256 NOT IN (SELECT image_sha256 FROM results)"
+                )
+                logger.info(f"Cache dropped {len(expired)} expired and {len(evicted)} least recently used entries")
+        for image_sha256 in expired + evicted:
+            self.index.remove(image_sha256)
+
+    def delete(self, image_sha256):
+        with self.db:
+            self.db.execute("DELETE FROM results WHERE image_sha256 = ?", (image_sha256,))
+            self.db.execute("DELETE FROM file_ids WHERE image_sha256 = ?", (image_sha256,))
+        self.index.remove(image_sha256)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,94 @@
+import os
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+
+# Share of a group chat relative to a private chat when they compete for slots.
+# Groups carry many users, so giving them more than 1 keeps them from starving.
+FAIR_GROUP_WEIGHT = float(os.getenv('FAIR_GROUP_WEIGHT', '1'))
+
+# Finish tags kept before forgetting keys that have gone quiet
+MAX_TRACKED_KEYS = 4096
+
+
+def chat_weight(chat_id):
+    # Group and channel ids are negative
+    if isinstance(chat_id, int) and chat_id < 0:
+        return FAIR_GROUP_WEIGHT
+    return 1.0
+
+
+class FairQueue(asyncio.Queue):
+    """asyncio.Queue that hands items out in start-time fair queuing order across keys.
+
+    Each key (a chat) gets its own virtual clock, so a chat with a hundred
+    items queued gets one turn for every turn of a chat with one, instead of
+    everyone waiting behind its backlog. Within a key items stay FIFO.
+    """
+
+    def __init__(self, maxsize=0, key=None, weight=chat_weight):
+        self._key = key or (lambda item: None)
+        self._weight = weight
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._seq = itertools.count()
+        self._virtual = 0.0
+        self._finish = {}
+
+    def _put(self, item):
+        key = self._key(item)
+        start = max(self._virtual, self._finish.get(key, 0.0))
+        self._finish[key] = start + 1.0 / self._weight(key)
+        heapq.heappush(self._queue, (start, next(self._seq), item))
+
+    def _get(self):
+        start, _, item = heapq.heappop(self._queue)
+        self._virtual = start
+        if len(self._finish) > MAX_TRACKED_KEYS:
+            # Keys whose tags the clock has passed would start at the clock anyway
+            self._finish = {k: f for k, f in self._finish.items() if f > self._virtual}
+        return item
+
+
+class FairSemaphore:
+    """Semaphore whose waiters are admitted in fair order across keys."""
+
+    def __init__(self, value, weight=chat_weight):
+        self._value = value
+        self._waiters = FairQueue(key=lambda waiter: waiter[0], weight=weight)
+
+    async def acquire(self, key=None):
+        future = asyncio.get_running_loop().create_future()
+        # Even uncontended acquires go through the queue so they count against the key's share
+        self._waiters.put_nowait((key, future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled; pass the slot on
+                self.release()
+            raise
+
+    def release(self):
+        self._value += 1
+        self._wake()
+
+    def _wake(self):
+        while self._value > 0 and not self._waiters.empty():
+            _, future = self._waiters.get_nowait()
+            if future.done():
+                continue
+            self._value -= 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, key=None):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
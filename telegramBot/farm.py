@@ -0,0 +1,222 @@
+import os
+import hmac
+import json
+import time
+import asyncio
+import logging
+from prover_client import ProverError
+
+logger = logging.getLogger(__name__)
+
+# Where remote prover workers connect; port 0 keeps the farm off
+PROVER_FARM_LISTEN = os.getenv('PROVER_FARM_LISTEN', '0.0.0.0')
+PROVER_FARM_PORT = int(os.getenv('PROVER_FARM_PORT', '0'))
+# Shared secret every worker sends in its hello
+PROVER_FARM_TOKEN = os.getenv('PROVER_FARM_TOKEN')
+# Seconds between pings; a worker silent for three of them is dropped
+PROVER_FARM_HEARTBEAT = float(os.getenv('PROVER_FARM_HEARTBEAT', '5'))
+# Ask workers for receipts and verify them with a local `host --serve` before
+# believing a result. With 0, only the journal is checked against the trades,
+# which trusts anyone holding the token not to forge proofs.
+PROVER_FARM_VERIFY = os.getenv('PROVER_FARM_VERIFY', '1') == '1'
+
+# Receipts come back as a single (long) line
+LINE_LIMIT = 64 * 1024 * 1024
+
+# Protocol: newline-delimited JSON over TCP, one connection per worker.
+#   worker -> bot  {"type": "hello", "name": str, "token": str, "capacity": int}
+#   bot -> worker  {"type": "welcome"}
+#   bot -> worker  {"type": "job", "id": int, "trades": [[entry, current, pnl, lev], ...], "receipt": bool}
+#   worker -> bot  {"type": "result", "id": int, "status": "ok", "results": [bool, ...],
+#                   "proof_hash": str, "journal": hex str, "receipt": hex str or null}
+#                  {"type": "result", "id": int, "status": "error", "error": str}
+#   bot -> worker  {"type": "ping"}    worker -> bot  {"type": "pong"}
+# The bot never sends a worker more jobs than its capacity, so workers pull
+# work by finishing it.
+
+
+class WorkerLost(ProverError):
+    """Raised for jobs on a worker that disconnected or stopped answering pings."""
+
+
+async def send(writer, message):
+    writer.write((json.dumps(message) + "\n").encode())
+    await writer.drain()
+
+
+class RemoteProver:
+    """One connected worker, with the same prove_batch() as a local ProverClient."""
+
+    def __init__(self, name, reader, writer, heartbeat=PROVER_FARM_HEARTBEAT):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.heartbeat = heartbeat
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.done = asyncio.Event()
+        self._pending = {}
+        self._next_id = 0
+
+    async def prove_batch(self, trades, timeout=None, receipt=False):
+        if self.closed:
+            raise WorkerLost(f"worker {self.name} is gone")
+        self._next_id += 1
+        job_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = future
+        try:
+            await send(self.writer, {"type": "job", "id": job_id, "trades": trades, "receipt": receipt})
+            response = await asyncio.wait_for(future, timeout)
+        except (ConnectionError, OSError) as e:
+            self.close()
+            raise WorkerLost(f"worker {self.name} went away: {str(e)}")
+        finally:
+            self._pending.pop(job_id, None)
+
+        if response.get("status") == "error":
+            raise ProverError(str(response.get("error", "unknown prover error")))
+        if not self._well_formed(response, len(trades)):
+            # A worker that can't count can't be trusted with the rest of the queue either
+            self.close()
+            raise WorkerLost(f"worker {self.name} sent a malformed result for {len(trades)} trades")
+        return {
+            "results": response["results"],
+            "proof_hash": response["proof_hash"],
+            "journal": response.get("journal"),
+            "receipt": response.get("receipt"),
+        }
+
+    @staticmethod
+    def _well_formed(response, count):
+        results = response.get("results")
+        return (
+            response.get("status") == "ok"
+            and isinstance(results, list) and len(results) == count
+            and all(isinstance(r, bool) for r in results)
+            and isinstance(response.get("proof_hash"), str)
+            and all(isinstance(response.get(k), (str, type(None))) for k in ("journal", "receipt"))
+        )
+
+    async def run(self):
+        """Read results and pongs until the connection drops."""
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                self.last_seen = time.monotonic()
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if message.get("type") == "result":
+                    future = self._pending.get(message.get("id"))
+                    if future and not future.done():
+                        future.set_result(message)
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"Lost connection to prover worker {self.name}: {str(e)}")
+        finally:
+            self.close()
+
+    async def keepalive(self):
+        """Ping the worker and drop it once it stops answering."""
+        while not self.closed:
+            await asyncio.sleep(self.heartbeat)
+            if time.monotonic() - self.last_seen > 3 * self.heartbeat:
+                logger.warning(f"Prover worker {self.name} missed its heartbeats, dropping it")
+                self.close()
+                return
+            try:
+                await send(self.writer, {"type": "ping"})
+            except (ConnectionError, OSError):
+                self.close()
+                return
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.done.set()
+        self.writer.close()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(WorkerLost(f"worker {self.name} disconnected"))
+        self._pending.clear()
+
+
+class ProverFarm:
+    """TCP endpoint that remote prover workers register with.
+
+    Every connected worker adds `capacity` provers to the pool, pulling from
+    the same queue as the local ones. Batches on a worker that drops are put
+    back on the queue for someone else. The pool checks what workers send
+    back (see `verify`) and drops any worker whose proof doesn't hold up.
+    """
+
+    def __init__(self, pool, listen=PROVER_FARM_LISTEN, port=PROVER_FARM_PORT,
+                 token=PROVER_FARM_TOKEN, heartbeat=PROVER_FARM_HEARTBEAT, verify=PROVER_FARM_VERIFY):
+        self.pool = pool
+        self.verify = verify
+        self.listen = listen
+        self.port = port
+        self.token = token
+        self.heartbeat = heartbeat
+        self.workers = {}
+        self._server = None
+        self._connections = set()
+
+    async def start(self):
+        if not self.token:
+            raise RuntimeError("PROVER_FARM_TOKEN must be set to run a prover farm")
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port, limit=LINE_LIMIT)
+        logger.info(f"Prover farm listening on {self.listen}:{self.port}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for remote in list(self.workers.values()):
+            remote.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    async def _handle(self, reader, writer):
+        self._connections.add(asyncio.current_task())
+        try:
+            await self._serve_worker(reader, writer)
+        finally:
+            self._connections.discard(asyncio.current_task())
+
+    async def _serve_worker(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), 3 * self.heartbeat))
+        except (asyncio.TimeoutError, ValueError, ConnectionError, OSError):
+            writer.close()
+            return
+        if hello.get("type") != "hello" or not hmac.compare_digest(str(hello.get("token", "")), self.token):
+            logger.warning(f"Rejected prover worker from {peer}")
+            writer.close()
+            return
+
+        name = f"{hello.get('name') or 'worker'}@{peer[0]}:{peer[1]}"
+        capacity = max(1, int(hello.get("capacity", 1)))
+        remote = RemoteProver(name, reader, writer, self.heartbeat)
+        await send(writer, {"type": "welcome"})
+        self.workers[name] = remote
+        provers = [self.pool.add_prover(remote, f"{name}#{i}") for i in range(capacity)]
+        keepalive = asyncio.create_task(remote.keepalive())
+        logger.info(f"Prover worker {name} joined with capacity {capacity}")
+        reading = asyncio.create_task(remote.run())
+        try:
+            # A missed heartbeat closes the worker without the read side noticing
+            await remote.done.wait()
+        finally:
+            remote.close()
+            del self.workers[name]
+            reading.cancel()
+            keepalive.cancel()
+            for task in provers:
+                self.pool.remove_prover(task)
+            logger.info(f"Prover worker {name} left")
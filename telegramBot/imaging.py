@@ -0,0 +1,78 @@
+import io
+import os
+import logging
+from PIL import Image, ImageChops, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Vision API detail level: "low" sends a single 512px view, "high" lets the
+# model read 512px tiles, "auto" leaves the choice to the API
+VISION_DETAIL = os.getenv('VISION_DETAIL', 'high')
+# High detail images get scaled to fit 2048x2048 and then to a 768px short
+# side by the API anyway, so anything bigger is wasted upload
+VISION_MAX_LONG_SIDE = int(os.getenv('VISION_MAX_LONG_SIDE', '2048'))
+VISION_MAX_SHORT_SIDE = int(os.getenv('VISION_MAX_SHORT_SIDE', '768'))
+VISION_JPEG_QUALITY = int(os.getenv('VISION_JPEG_QUALITY', '85'))
+# How far a pixel may drift from the border colour and still count as border
+BORDER_TOLERANCE = int(os.getenv('BORDER_TOLERANCE', '12'))
+
+# Low detail is a single 512x512 view
+LOW_DETAIL_SIDE = 512
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+
+
+def crop_borders(image: Image.Image, tolerance=BORDER_TOLERANCE) -> Image.Image:
+    """Trim solid margins (letterboxing, empty app chrome) around the content."""
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background).convert("L")
+    # Ignore compression noise in the margin
+    mask = diff.point(lambda value: 255 if value > tolerance else 0)
+    box = mask.getbbox()
+    if not box:
+        return image
+    return image.crop(box)
+
+
+def target_size(width, height, detail=VISION_DETAIL):
+    """Smallest size the API would still look at for this detail level."""
+    if detail == "low":
+        long_side, short_side = LOW_DETAIL_SIDE, LOW_DETAIL_SIDE
+    else:
+        long_side, short_side = VISION_MAX_LONG_SIDE, VISION_MAX_SHORT_SIDE
+    scale = min(1.0, long_side / max(width, height), short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(image_bytes: bytes, detail=VISION_DETAIL):
+    """Crop, downscale and re-encode an image for the vision API.
+
+    Returns (bytes, mime type). If the result isn't smaller than what came in
+    the original bytes are kept, labelled with their real type.
+    """
+    try:
+        original = Image.open(io.BytesIO(image_bytes))
+        mime = MIME_TYPES.get(original.format, "image/jpeg")
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning(f"Couldn't decode image, sending it as is: {str(e)}")
+        return image_bytes, "image/jpeg"
+
+    image = crop_borders(image)
+    size = target_size(*image.size, detail=detail)
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    prepared = out.getvalue()
+    if len(prepared) >= len(image_bytes):
+        return image_bytes, mime
+
+    logger.info(f"Prepared image {original.size} -> {image.size}, {len(image_bytes)} -> {len(prepared)} bytes")
+    return prepared, "image/jpeg"
@@ -0,0 +1,102 @@
+import math
+import random
+from typing import Dict
+
+
+FAKE_MESSAGES = [
+        "🚨 SCAM ALERT: This trade's faker than monopoly money! 💸",
+        "❌ Busted! This PnL couldn't fool a calculator. 📉",
+        "🕵️‍♂️ We investigated, and it's a hard NOPE. 🚫",
+        "😂 Fake trade alert—somebody call the SEC! 📞",
+        "🔥 This trade's cooked, and not in a good way. 🧯",
+        "😅 Nice try, but we see through the smoke and mirrors. 🪞",
+        "💀 RIP to this fake trade—it's DOA. 🚑",
+        "🤡 Clown move detected—this PnL is a circus. 🎪",
+        "🛑 Halted: This trade's about as real as Bigfoot. 🦶",
+        "😤 Fraud level: Over 9000. This trade's a joke! 🤬",
+        "🤔 Fake it till you make it? Not here. 🚫",
+        "🚨 Fraud detected—somebody call the blockchain police! 👮",
+        "📉 This trade's got more red flags than a bullring. 🚩",
+        "😬 Scammy vibes confirmed. Try harder next time! 🕵️",
+        "💥 This PnL just imploded under scrutiny. BOOM! 💣",
+        "❗ Faker than a $3 bill. Not today! 💵",
+        "🎭 Scam revealed—this trade's all smoke and mirrors. 🔍",
+        "📢 Fraudulent trade spotted—tell your friends. 🗣️",
+        "🪤 Caught in 4K! This trade's a straight-up scam. 🎥",
+    ]
+
+VERIFIED_MESSAGES = [
+        "🚀 This trade checks out—moonshot confirmed! 🌕",
+        "🤑 Trade verified—somebody's swimming in gains! 💸",
+        "🎯 Bullseye! This trade's the real deal. 🐂",
+        "💎 Hands confirmed—this trader's a diamond among us! ✨",
+        "🏆 Verified! Somebody deserves a trophy for this one. 🏅",
+        "📊 PnL verified and it's pure gold. 💰",
+        "✅ This trade's so clean, it sparkles. ✨",
+        "🌟 True story—this PnL passes the vibe check. 🙌",
+        "🔥 Legit as they come! Somebody's on a heater! ♨️",
+        "📈 This trade's climbing the charts, and it's all real. 🎤",
+        "🎉 Big win verified—pop the champagne! 🍾",
+        "💸 This trade's the truth and nothing but the truth. 📜",
+        "📈 The math adds up—green candles all day! 🕯️",
+        "⚡ Verified: This trade's electrifying and real. ⚡",
+        "💪 Strong hands, strong gains. Verified PnL! 🧾",
+        "🚀 Confirmed legit—straight to the moon! 🌌",
+        "📜 PnL verified—honesty pays off! 💵",
+        "🎯 Bull run verified—this one's the real McCoy. 🤝",
+    ]
+
+UNREADABLE_TEXT = "❌ Ay yo, this screenshot ain't it chief! Make sure it's clear and shows the full trade. Try again! 🔄"
+BUSY_TEXT = "🥵 The prover is slammed right now fam, try again in a few! 🔄"
+TIMEOUT_TEXT = "⌛ The prover took too long on this one. Give it another shot! 🔄"
+ERROR_TEXT = "💀 Ayo something's not working right! Give it another shot! 🔄"
+
+def data_text(trade_data: Dict) -> str:
+    return (
+        "📊 Aight, here's what I'm seeing:\n\n"
+        f"Entry: ${trade_data['entry']} 💰\n"
+        f"Exit: ${trade_data['exit']} 💸\n"
+        f"Gains: {trade_data['percentage']}% 📈\n"
+        f"Leverage: {trade_data['leverage']}x 🎯\n\n"
+        "🔍 Running that ZK proof check, hold tight..."
+    )
+
+def slow_down_text(retry_after: float) -> str:
+    return f"🐌 Easy there fam, you're sending screenshots faster than I can check 'em! Try again in {math.ceil(retry_after)}s ⏳"
+
+def verified_text(proof_link: str, anchor: Dict = None, proof_hash: str = None) -> str:
+    verified_msg = random.choice(VERIFIED_MESSAGES)
+    inclusion = ""
+    if proof_hash:
+        # Trades are proven in batches, so this hash covers every trade in the batch
+        inclusion += f"🧮 Batch proof hash: {proof_hash}\n"
+    if anchor:
+        inclusion += (
+            f"🌳 Root: {anchor['root']}\n"
+            f"🧾 Inclusion proof: [{', '.join(anchor['proof'])}]\n"
+        )
+    if inclusion:
+        inclusion += "\n"
+    return (
+        f"{verified_msg}\n\n"
+        f"NO CAP 🫡\n\n"
+        f"🔗 Proof: {proof_link}\n\n"
+        f"{inclusion}"
+        "You know where to find me if you need more verification, homie! 😉"
+    )
+
+def fake_text(trade_data: Dict) -> str:
+    fake_msg = random.choice(FAKE_MESSAGES)
+    return (
+        f"{fake_msg}\n\n"
+        f"This is pure CAP! 🧢\n\n"
+        f"Entry: ${trade_data['entry']} ❌\n"
+        f"Exit: ${trade_data['exit']} ❌\n"
+        f"Claimed Gains: {trade_data['percentage']}% 🧢\n\n"
+        "Better luck next time fam! 😏"
+    )
+
+def cached_text(cached: Dict) -> str:
+    if cached['proof_hash']:
+        return verified_text(cached['proof_link'], cached['anchor'], cached['proof_hash'])
+    return fake_text(cached['trade_data'])
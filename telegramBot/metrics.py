@@ -0,0 +1,83 @@
+import os
+import logging
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Where the Prometheus scrape endpoint listens; port 0 turns it off
+METRICS_ADDR = os.getenv('METRICS_ADDR', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Stages range from milliseconds (precheck) to minutes (proving, block inclusion)
+STAGE_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "zkpnl_stage_seconds", "Time a job spends running in each pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_QUEUED_SECONDS = Histogram(
+    "zkpnl_stage_queued_seconds", "Time a job waits for a free worker before each stage", ["stage"],
+    buckets=STAGE_BUCKETS
+)
+STAGE_FAILURES = Counter("zkpnl_stage_failures_total", "Jobs that raised inside a stage", ["stage"])
+STAGE_RUNNING = Gauge("zkpnl_stage_running", "Jobs currently running in each stage", ["stage"])
+JOBS_IN_FLIGHT = Gauge("zkpnl_jobs_in_flight", "Jobs accepted and not yet finished")
+VERDICTS = Counter(
+    "zkpnl_verdicts_total", "Finished jobs by verdict (verified, fake, unreadable, busy, timeout, error)", ["verdict"]
+)
+THROTTLED = Counter("zkpnl_throttled_total", "Screenshots turned away by admission control", ["scope"])
+CACHE_HITS = Counter("zkpnl_cache_hits_total", "Screenshots answered from the result cache", ["match"])
+
+EXTRACTIONS = Counter("zkpnl_extractions_total", "Trade data extractions by where they came from", ["source"])
+OPENAI_SECONDS = Histogram("zkpnl_openai_seconds", "Vision API call time, retries included", buckets=STAGE_BUCKETS)
+OPENAI_TOKENS = Counter("zkpnl_openai_tokens_total", "Vision API tokens used", ["kind"])
+
+PROVER_SECONDS = Histogram(
+    "zkpnl_prover_seconds", "Wall time of one prover batch", ["outcome"], buckets=STAGE_BUCKETS
+)
+PROVER_BATCH_TRADES = Histogram(
+    "zkpnl_prover_batch_trades", "Trades proven per prover batch", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+GAS_USED = Counter("zkpnl_gas_used_total", "Gas used by mined anchoring transactions")
+GAS_SPENT_WEI = Counter("zkpnl_gas_spent_wei_total", "Fees paid for mined anchoring transactions, in wei")
+TRANSACTIONS = Counter("zkpnl_transactions_total", "Mined anchoring transactions by receipt status", ["status"])
+
+
+class QueueCollector:
+    """Reads queue depths at scrape time instead of tracking every put and get."""
+
+    def __init__(self, pipeline, prover_pool):
+        self.pipeline = pipeline
+        self.prover_pool = prover_pool
+
+    def collect(self):
+        depth = GaugeMetricFamily("zkpnl_queue_depth", "Jobs waiting in each pipeline stage's queue", labels=["stage"])
+        for stage, size in self.pipeline.depths().items():
+            depth.add_metric([stage], size)
+        yield depth
+        prover = self.prover_pool.stats()
+        yield GaugeMetricFamily("zkpnl_prover_queue_depth", "Proofs waiting for a prover", value=prover["queued"])
+        yield GaugeMetricFamily("zkpnl_prover_busy", "Provers currently proving", value=prover["active"])
+
+
+_collector = None
+_serving = False
+
+
+def start(pipeline, prover_pool, addr=METRICS_ADDR, port=METRICS_PORT):
+    """Serve /metrics on a background thread.
+
+    Safe to call again when the Application is restarted: the queue collector
+    is swapped for one reading the new pipeline and the server keeps running.
+    """
+    global _collector, _serving
+    if _collector is not None:
+        REGISTRY.unregister(_collector)
+    _collector = QueueCollector(pipeline, prover_pool)
+    REGISTRY.register(_collector)
+    if not port or _serving:
+        return
+    start_http_server(port, addr)
+    _serving = True
+    logger.info(f"Serving metrics on http://{addr}:{port}/metrics")
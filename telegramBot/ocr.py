@@ -0,0 +1,174 @@
+import io
+import os
+import re
+import logging
+from statistics import mean
+from PIL import Image, ImageOps
+from rpc import normalize_zk_inputs, precheck_pnl
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+logger = logging.getLogger(__name__)
+
+# Set to 0 to always use the vision API
+OCR_ENABLED = os.getenv('OCR_ENABLED', '1') == '1'
+# Lowest Tesseract word confidence (0-100) we accept for any extracted field
+OCR_MIN_CONFIDENCE = float(os.getenv('OCR_MIN_CONFIDENCE', '80'))
+# Text shorter than this gets upscaled, Tesseract reads best at ~30px line height
+OCR_MIN_WIDTH = int(os.getenv('OCR_MIN_WIDTH', '1200'))
+
+NUMBER = r"([+\-−]?\s?[\d,]*\.?\d+)"
+
+# Share card layouts. `marker` identifies the exchange, each field pattern
+# captures its number from a single OCR line.
+TEMPLATES = [
+    {
+        "name": "binance",
+        "marker": re.compile(r"binance", re.I),
+        "fields": {
+            "entry": re.compile(r"entry\s*price\s*" + NUMBER, re.I),
+            "exit": re.compile(r"(?:last|mark|close|closing)\s*price\s*" + NUMBER, re.I),
+            "percentage": re.compile(NUMBER + r"\s?%"),
+            "leverage": re.compile(r"(\d+)\s?[xX]\b"),
+        },
+    },
+    {
+        "name": "bybit",
+        "marker": re.compile(r"bybit", re.I),
+        "fields": {
+            "entry": re.compile(r"entry\s*price\s*" + NUMBER, re.I),
+            "exit": re.compile(r"(?:mark|exit|last|filled)\s*price\s*" + NUMBER, re.I),
+            "percentage": re.compile(NUMBER + r"\s?%"),
+            "leverage": re.compile(r"(\d+(?:\.\d+)?)\s?[xX]\b"),
+        },
+    },
+    {
+        "name": "okx",
+        "marker": re.compile(r"\bokx\b", re.I),
+        "fields": {
+            "entry": re.compile(r"(?:entry|open|avg\.?\s*open)\s*price\s*" + NUMBER, re.I),
+            "exit": re.compile(r"(?:mark|last|close|exit)\s*price\s*" + NUMBER, re.I),
+            "percentage": re.compile(NUMBER + r"\s?%"),
+            "leverage": re.compile(r"(\d+(?:\.\d+)?)\s?[xX]\b"),
+        },
+    },
+    {
+        "name": "bitget",
+        "marker": re.compile(r"bitget", re.I),
+        "fields": {
+            "entry": re.compile(r"(?:entry|average\s*open|open)\s*price\s*" + NUMBER, re.I),
+            "exit": re.compile(r"(?:mark|current|closing|close)\s*price\s*" + NUMBER, re.I),
+            "percentage": re.compile(NUMBER + r"\s?%"),
+            "leverage": re.compile(r"(\d+)\s?[xX]\b"),
+        },
+    },
+]
+
+_available = None
+
+
+def available():
+    """Whether pytesseract and the tesseract binary are both installed."""
+    global _available
+    if _available is None:
+        _available = False
+        if not OCR_ENABLED:
+            pass
+        elif pytesseract is None:
+            logger.info("pytesseract isn't installed, local OCR disabled")
+        else:
+            try:
+                pytesseract.get_tesseract_version()
+                _available = True
+            except Exception as e:
+                logger.info(f"Tesseract isn't usable, local OCR disabled: {str(e)}")
+    return _available
+
+
+def _prepare(image_bytes):
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))).convert("L")
+    if image.width < OCR_MIN_WIDTH:
+        scale = OCR_MIN_WIDTH / image.width
+        image = image.resize((OCR_MIN_WIDTH, round(image.height * scale)), Image.LANCZOS)
+    # Share cards are mostly light text on dark backgrounds, Tesseract wants the opposite
+    if mean(image.resize((32, 32)).getdata()) < 128:
+        image = ImageOps.invert(image)
+    return ImageOps.autocontrast(image)
+
+
+def _lines(image):
+    """OCR the image into (text, lowest word confidence) per line."""
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    lines = {}
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        confidence = float(data["conf"][i])
+        if not word or confidence < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        words, confidences = lines.setdefault(key, ([], []))
+        words.append(word)
+        confidences.append(confidence)
+    return [(" ".join(words), min(confidences)) for words, confidences in lines.values()]
+
+
+def _number(text):
+    return float(text.replace("−", "-").replace(",", "").replace(" ", ""))
+
+
+def _match(template, lines):
+    trade_data = {}
+    confidence = 100.0
+    for field, pattern in template["fields"].items():
+        for text, line_confidence in lines:
+            found = pattern.search(text)
+            if found:
+                value = _number(found.group(1))
+                trade_data[field] = int(value) if field == "leverage" and value.is_integer() else value
+                confidence = min(confidence, line_confidence)
+                break
+        else:
+            return None, 0
+    return trade_data, confidence
+
+
+def extract_trade_data(image_bytes):
+    """Read trade data off a known exchange share card.
+
+    Returns None unless a template matches every field with enough confidence
+    and the numbers agree with each other, so anything doubtful still goes to
+    the vision API. Blocking, run it in a thread.
+    """
+    if not available():
+        return None
+    try:
+        lines = _lines(_prepare(image_bytes))
+    except Exception as e:
+        logger.warning(f"Local OCR failed: {str(e)}")
+        return None
+
+    full_text = "\n".join(text for text, _ in lines)
+    for template in TEMPLATES:
+        if not template["marker"].search(full_text):
+            continue
+        trade_data, confidence = _match(template, lines)
+        if not trade_data or confidence < OCR_MIN_CONFIDENCE:
+            logger.info(f"Local OCR matched {template['name']} but isn't sure enough ({confidence:.0f})")
+            return None
+        # A dropped decimal point reads as a fake PnL, so let the vision API
+        # double check anything that doesn't add up
+        try:
+            consistent = precheck_pnl(*normalize_zk_inputs(
+                trade_data['entry'], trade_data['exit'], trade_data['percentage'], trade_data['leverage']
+            ))
+        except ValueError:
+            consistent = False
+        if not consistent:
+            logger.info(f"Local OCR read {trade_data} from a {template['name']} card but it doesn't add up")
+            return None
+        logger.info(f"Local OCR extracted trade data from a {template['name']} card: {trade_data}")
+        return trade_data
+    return None
@@ -0,0 +1,104 @@
+import io
+import os
+from PIL import Image, ImageOps
+from imaging import crop_borders
+
+# Side of the gradient grid, the hash has HASH_SIZE**2 bits. Share cards from
+# one exchange have the same layout, so the hash needs to be fine enough to
+# tell their numbers apart, not just their shape.
+HASH_SIZE = int(os.getenv('PHASH_SIZE', '16'))
+
+
+def dhash(image_bytes: bytes, hash_size=HASH_SIZE) -> str:
+    """Difference hash as hex; survives recompression, resizing and border crops."""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))).convert("L")
+    image = crop_borders(image)
+    pixels = list(image.resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def popcount(x: int) -> int:
+    # int.bit_count() would need Python 3.10
+    return bin(x).count("1")
+
+
+def distance(a: str, b: str) -> int:
+    return popcount(int(a, 16) ^ int(b, 16))
+
+
+class HashIndex:
+    """Multi-index hash table for Hamming distance lookups.
+
+    Hashes are cut into max_distance + 1 chunks. Two hashes within
+    max_distance bits of each other can differ in at most max_distance
+    chunks, so they agree exactly on at least one, and a search only
+    compares the query with entries sharing one of its chunks. (A BK-tree
+    can't prune much here: 256-bit dhashes mostly sit around 128 bits apart,
+    so it ends up visiting a large share of its nodes.)
+
+    One hash per key; adding a key again replaces its hash.
+    """
+
+    def __init__(self, max_distance, bits=HASH_SIZE * HASH_SIZE):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        bounds = [bits * i // chunks for i in range(chunks + 1)]
+        # (shift, mask) of each chunk's bits
+        self._chunks = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+        # One table per chunk: chunk value -> keys
+        self._tables = [{} for _ in self._chunks]
+        self._hashes = {}
+
+    @property
+    def size(self):
+        return len(self._hashes)
+
+    def _parts(self, value):
+        return [(table, (value >> shift) & mask) for table, (shift, mask) in zip(self._tables, self._chunks)]
+
+    def add(self, hash_hex, key):
+        self.remove(key)
+        value = int(hash_hex, 16)
+        self._hashes[key] = value
+        for table, chunk in self._parts(value):
+            table.setdefault(chunk, set()).add(key)
+
+    def remove(self, key):
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        for table, chunk in self._parts(value):
+            keys = table[chunk]
+            keys.discard(key)
+            if not keys:
+                del table[chunk]
+
+    def search(self, hash_hex, max_distance=None):
+        """All (distance, key) within max_distance (at most the index's), nearest first.
+
+        Safe to run in a thread while the event loop adds and removes keys;
+        a key changing mid-search is either found or not.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        value = int(hash_hex, 16)
+        seen = set()
+        found = []
+        for table, chunk in self._parts(value):
+            for key in tuple(table.get(chunk, ())):
+                if key in seen:
+                    continue
+                seen.add(key)
+                other = self._hashes.get(key)
+                if other is None:
+                    continue
+                d = popcount(other ^ value)
+                if d <= max_distance:
+                    found.append((d, key))
+        found.sort()
+        return found
@@ -0,0 +1,484 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+from vision import analyze_pnl_image
+from rpc import normalize_zk_inputs, precheck_pnl
+from prover import ProverBusy, ProverTimeout, PROVER_QUEUE_SIZE
+from cache import image_hash
+from phash import dhash
+from status import StatusEditor
+from fair import FairQueue
+from prover_client import ProverError
+from telegram.error import BadRequest, NetworkError, RetryAfter
+import messages
+import metrics
+
+logger = logging.getLogger(__name__)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Replicas behind one webhook each need their own file, or they'd resume each other's jobs
+JOBS_PATH = os.getenv('JOBS_PATH', os.path.join(script_dir, "jobs.sqlite3"))
+
+# Every job walks these in order; a stage may skip ahead to notify
+STAGES = ["download", "extract", "precheck", "prove", "anchor", "notify", "confirm"]
+
+# Concurrent workers per stage. Each stage waits on a different resource
+# (Telegram, the vision API, the prover, the chain), so each gets its own limit.
+DEFAULT_WORKERS = {
+    "download": 8,
+    "extract": 8,
+    "precheck": 2,
+    "prove": 32,
+    "anchor": 32,
+    "notify": 8,
+    "confirm": 64,
+}
+STAGE_WORKERS = {
+    stage: int(os.getenv(f'PIPELINE_{stage.upper()}_WORKERS', str(default)))
+    for stage, default in DEFAULT_WORKERS.items()
+}
+
+# Jobs that may wait for a free worker in each stage, 0 for no limit. Jobs
+# past the prover's own queue would otherwise pile up in front of the prove
+# stage with no backpressure, so a full prove queue answers "busy" instead.
+DEFAULT_QUEUE_SIZES = {"prove": PROVER_QUEUE_SIZE}
+STAGE_QUEUE_SIZES = {
+    stage: int(os.getenv(f'PIPELINE_{stage.upper()}_QUEUE', str(DEFAULT_QUEUE_SIZES.get(stage, 0))))
+    for stage in STAGES
+}
+
+# Times a stage is tried before a job that keeps hitting transient errors is
+# given up, and the first delay between tries (doubling each time)
+PIPELINE_MAX_ATTEMPTS = int(os.getenv('PIPELINE_MAX_ATTEMPTS', '5'))
+PIPELINE_RETRY_DELAY = float(os.getenv('PIPELINE_RETRY_DELAY', '5'))
+
+# Network trouble, RPC and Telegram hiccups, a crashed prover: worth another go.
+# Anything else is a bug or bad data, and retrying won't change it.
+TRANSIENT_ERRORS = (OSError, NetworkError, RetryAfter, ProverError)
+# Subclasses of the above that are the request's fault, e.g. a file that's too
+# big or a status message that was deleted (BadRequest is a NetworkError in PTB)
+PERMANENT_ERRORS = (BadRequest,)
+
+
+def retry_delay(error, attempts):
+    """Seconds before retrying after `error`, or None if it isn't worth retrying."""
+    if not isinstance(error, TRANSIENT_ERRORS) or isinstance(error, PERMANENT_ERRORS):
+        return None
+    if attempts >= PIPELINE_MAX_ATTEMPTS:
+        return None
+    if isinstance(error, RetryAfter):
+        # Telegram tells us exactly how long to back off
+        return error.retry_after
+    return PIPELINE_RETRY_DELAY * 2 ** (attempts - 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    file_unique_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    data TEXT NOT NULL,
+    image BLOB,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class JobStore:
+    """SQLite table of unfinished verification jobs.
+
+    A job row records the next stage to run and everything earlier stages
+    produced, so a restarted bot picks up where it left off. A stage that
+    hits a transient error leaves the job where it is to be retried; only
+    finished jobs are deleted.
+    """
+
+    def __init__(self, path=JOBS_PATH):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def create(self, chat_id, message_id, file_id, file_unique_id):
+        now = time.time()
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (chat_id, message_id, file_id, file_unique_id, stage, data, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, message_id, file_id, file_unique_id, STAGES[0], "{}", now, now)
+            )
+        return {
+            "id": cursor.lastrowid,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "file_id": file_id,
+            "file_unique_id": file_unique_id,
+            "stage": STAGES[0],
+            "data": {},
+            "image": None,
+        }
+
+    def save(self, job):
+        with self.db:
+            self.db.execute(
+                "UPDATE jobs SET stage = ?, data = ?, image = ?, updated_at = ? WHERE id = ?",
+                (job["stage"], json.dumps(job["data"]), job["image"], time.time(), job["id"])
+            )
+
+    def finish(self, job):
+        with self.db:
+            self.db.execute("DELETE FROM jobs WHERE id = ?", (job["id"],))
+
+    def unfinished(self):
+        rows = self.db.execute(
+            "SELECT id, chat_id, message_id, file_id, file_unique_id, stage, data, image FROM jobs ORDER BY id"
+        ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "chat_id": row[1],
+                "message_id": row[2],
+                "file_id": row[3],
+                "file_unique_id": row[4],
+                "stage": row[5],
+                "data": json.loads(row[6]),
+                "image": row[7],
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        self.db.close()
+
+
+class Pipeline:
+    """Moves jobs through the verification stages, checkpointing after each one.
+
+    Every stage has its own queue and worker tasks, so a slow prover doesn't
+    hold vision API slots and each stage can be sized for its own bottleneck.
+    """
+
+    def __init__(self, bot, store, prover_pool, anchorer, receipt_tracker, result_cache,
+                 workers=STAGE_WORKERS, queue_sizes=STAGE_QUEUE_SIZES):
+        self.bot = bot
+        self.status = StatusEditor(bot)
+        self.store = store
+        self.prover_pool = prover_pool
+        self.anchorer = anchorer
+        self.receipt_tracker = receipt_tracker
+        self.result_cache = result_cache
+        self.workers = workers
+        self.queue_sizes = queue_sizes
+        self._queues = {}
+        self._tasks = []
+        self._retries = set()
+        self._inflight = set()
+        metrics.JOBS_IN_FLIGHT.set_function(lambda: len(self._inflight))
+
+    async def start(self):
+        # Each stage serves chats in turn, so a flood from one chat queues behind itself
+        self._queues = {
+            stage: FairQueue(self.queue_sizes.get(stage, 0), key=lambda job: job["chat_id"])
+            for stage in STAGES
+        }
+        self._tasks = [
+            asyncio.create_task(self._worker(stage))
+            for stage in STAGES
+            for _ in range(self.workers[stage])
+        ]
+
+    async def stop(self):
+        # Jobs waiting to retry are on disk and get resumed on the next start
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job):
+        """Queue a job at its current stage, or turn it away as busy if that queue is full."""
+        self._inflight.add(job["id"])
+        job["queued_at"] = time.monotonic()
+        if self._queues[job["stage"]].full():
+            logger.warning(f"Stage {job['stage']} queue is full, turning job {job['id']} away")
+            job["data"]["verdict"] = "busy"
+            job["stage"] = "notify"
+            self.store.save(job)
+        self._queues[job["stage"]].put_nowait(job)
+
+    def depths(self):
+        return {stage: queue.qsize() for stage, queue in self._queues.items()}
+
+    async def resume(self):
+        """Requeue every job left over from a previous run."""
+        jobs = self.store.unfinished()
+        for job in jobs:
+            logger.info(f"Resuming job {job['id']} at stage {job['stage']}")
+            self.submit(job)
+        return len(jobs)
+
+    async def _worker(self, stage):
+        queue = self._queues[stage]
+        while True:
+            job = await queue.get()
+            started = time.monotonic()
+            metrics.STAGE_QUEUED_SECONDS.labels(stage).observe(started - job.pop("queued_at", started))
+            metrics.STAGE_RUNNING.labels(stage).inc()
+            retry_in = None
+            try:
+                job["stage"] = await getattr(self, f"_{stage}")(job)
+                job["data"].pop("attempts", None)
+            except Exception as e:
+                metrics.STAGE_FAILURES.labels(stage).inc()
+                attempts = job["data"].get("attempts", 0) + 1
+                retry_in = retry_delay(e, attempts)
+                if retry_in is not None:
+                    logger.warning(f"Job {job['id']} hit {str(e) or type(e).__name__} at stage {stage}, "
+                                   f"retry {attempts}/{PIPELINE_MAX_ATTEMPTS - 1}")
+                    job["data"]["attempts"] = attempts
+                else:
+                    logger.error(f"Job {job['id']} failed at stage {stage}: {str(e)}")
+                    job["stage"] = None
+                    job["data"]["verdict"] = "error"
+                    try:
+                        await self._edit(job, messages.ERROR_TEXT)
+                    except Exception as e:
+                        logger.error(f"Couldn't tell job {job['id']} about the failure: {str(e)}")
+            finally:
+                queue.task_done()
+                metrics.STAGE_RUNNING.labels(stage).dec()
+                metrics.STAGE_SECONDS.labels(stage).observe(time.monotonic() - started)
+
+            if retry_in is not None:
+                # Still at the same stage, so a restart before the retry resumes it too
+                self.store.save(job)
+                self._retry_later(job, retry_in)
+            elif job["stage"] is None:
+                self.store.finish(job)
+                self._inflight.discard(job["id"])
+                metrics.VERDICTS.labels(job["data"].get("verdict", "error")).inc()
+            else:
+                self.store.save(job)
+                self.submit(job)
+
+    def _retry_later(self, job, delay):
+        def resubmit():
+            self._retries.discard(handle)
+            self.submit(job)
+        handle = asyncio.get_running_loop().call_later(delay, resubmit)
+        self._retries.add(handle)
+
+    async def _edit(self, job, text, wait=True):
+        """Show `text` in the job's status message.
+
+        Progress updates pass wait=False so the job moves on while the edit
+        waits its turn under the chat's rate limit; a newer text replaces
+        one that hasn't gone out yet.
+        """
+        shown = self.status.set(job["chat_id"], job["message_id"], text)
+        if wait:
+            await shown
+        else:
+            shown.add_done_callback(lambda f: self._log_edit_error(job, f))
+
+    @staticmethod
+    def _log_edit_error(job, future):
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Status edit for job {job['id']} failed: {str(future.exception())}")
+
+    async def _download(self, job):
+        image_file = await self.bot.get_file(job["file_id"])
+
+        # Keep the image in memory so concurrent requests never share a file
+        image_bytes = bytes(await image_file.download_as_bytearray())
+        logger.info(f"Downloaded image {job['file_unique_id']} ({len(image_bytes)} bytes)")
+
+        image_sha256 = image_hash(image_bytes)
+        job["data"]["image_sha256"] = image_sha256
+        cached = self.result_cache.get_by_hash(image_sha256)
+        if cached:
+            logger.info(f"Cache hit for image {image_sha256}")
+            metrics.CACHE_HITS.labels("sha256").inc()
+            self.result_cache.add_file_id(job["file_unique_id"], image_sha256)
+            self._use_cached(job, cached)
+            return "notify"
+
+        # Reposts are often recompressed, resized or cropped. A look-alike can
+        # still be an edited copy with different numbers, so it's only reused
+        # once extraction reads the same trade off it.
+        try:
+            job["data"]["phash"] = await asyncio.to_thread(dhash, image_bytes)
+        except Exception as e:
+            logger.warning(f"Couldn't hash image {image_sha256}: {str(e)}")
+        else:
+            similar_sha256, _ = await self.result_cache.get_similar(job["data"]["phash"])
+            job["data"]["similar_sha256"] = similar_sha256
+
+        job["image"] = image_bytes
+        return "extract"
+
+    @staticmethod
+    def _use_cached(job, cached):
+        job["data"]["cached"] = True
+        job["data"]["trade_data"] = cached["trade_data"]
+        if cached["proof_hash"]:
+            job["data"].update(verdict="verified", proof_hash=cached["proof_hash"],
+                               proof_link=cached["proof_link"], anchor=cached["anchor"])
+        else:
+            job["data"]["verdict"] = "fake"
+
+    def _same_trade(self, a, b):
+        # Compare what the prover would see, so 19.7 and 19.70 count as equal
+        try:
+            return normalize_zk_inputs(a['entry'], a['exit'], a['percentage'], a['leverage']) == \
+                normalize_zk_inputs(b['entry'], b['exit'], b['percentage'], b['leverage'])
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    async def _extract(self, job):
+        await self._edit(job, "🧠 Running the numbers through the verification machine...", wait=False)
+
+        # Process image and get trading data
+        trade_data = await analyze_pnl_image(job["image"], key=job["chat_id"])
+        job["image"] = None
+        if not trade_data:
+            job["data"]["verdict"] = "unreadable"
+            return "notify"
+
+        job["data"]["trade_data"] = trade_data
+        # Show extracted data with style while the proof gets going
+        await self._edit(job, messages.data_text(trade_data), wait=False)
+
+        similar_sha256 = job["data"].get("similar_sha256")
+        if similar_sha256:
+            cached = self.result_cache.get_by_hash(similar_sha256)
+            if cached and self._same_trade(cached["trade_data"], trade_data):
+                logger.info(f"Image {job['data']['image_sha256']} is a repost of {similar_sha256}")
+                metrics.CACHE_HITS.labels("similar").inc()
+                self.result_cache.add_file_id(job["file_unique_id"], similar_sha256)
+                self._use_cached(job, cached)
+                return "notify"
+        return "precheck"
+
+    async def _precheck(self, job):
+        trade_data = job["data"]["trade_data"]
+        try:
+            inputs = normalize_zk_inputs(
+                trade_data['entry'],
+                trade_data['exit'],
+                trade_data['percentage'],
+                trade_data['leverage']
+            )
+        except (TypeError, ValueError) as e:
+            logger.info(f"Job {job['id']} has inputs the host can't take: {str(e)}")
+            job["data"]["verdict"] = "fake"
+            return "notify"
+
+        if not precheck_pnl(*inputs):
+            job["data"]["verdict"] = "fake"
+            return "notify"
+        job["data"]["inputs"] = inputs
+        return "prove"
+
+    async def _prove(self, job):
+        try:
+            proof_future, ahead = self.prover_pool.submit(*job["data"]["inputs"], key=job["chat_id"])
+            if ahead:
+                await self._edit(
+                    job,
+                    f"{messages.data_text(job['data']['trade_data'])}\n\n⏳ You're #{ahead + 1} in line for the prover...",
+                    wait=False
+                )
+            proof_hash = await proof_future
+        except ProverBusy:
+            job["data"]["verdict"] = "busy"
+            return "notify"
+        except ProverTimeout:
+            job["data"]["verdict"] = "timeout"
+            return "notify"
+
+        if not proof_hash:
+            job["data"]["verdict"] = "fake"
+            return "notify"
+        job["data"]["proof_hash"] = proof_hash
+        return "anchor"
+
+    async def _anchor(self, job):
+        anchor = await self.anchorer.submit(job["data"]["proof_hash"])
+        job["data"].update(
+            verdict="verified",
+            proof_link=anchor["link"],
+            tx_hash=anchor["tx_hash"],
+            anchor={"root": anchor["root"], "proof": anchor["proof"]},
+        )
+        return "notify"
+
+    async def _notify(self, job):
+        data = job["data"]
+        verdict = data["verdict"]
+
+        if verdict == "unreadable":
+            await self._edit(job, messages.UNREADABLE_TEXT)
+        elif verdict == "busy":
+            await self._edit(job, messages.BUSY_TEXT)
+        elif verdict == "timeout":
+            await self._edit(job, messages.TIMEOUT_TEXT)
+        elif verdict == "fake":
+            if not data.get("cached"):
+                self._remember(job)
+            await self._edit(job, messages.fake_text(data["trade_data"]))
+        elif verdict == "verified":
+            text = messages.verified_text(data["proof_link"], data["anchor"], data["proof_hash"])
+            if data.get("cached"):
+                await self._edit(job, text)
+            else:
+                self._remember(job)
+                await self._edit(job, f"{text}\n\n⏳ Waiting on the chain to lock it in...", wait=False)
+                data["text"] = text
+                return "confirm"
+        return None
+
+    def _remember(self, job):
+        """Cache a verdict for reposts.
+
+        Only "verified" and "fake" get here, and "fake" only ever means the
+        guest formula rejected the trade. Prover crashes, timeouts and a full
+        queue end up as "error", "timeout" or "busy" and are never stored, or
+        a genuine screenshot would be branded fake until the entry expired.
+        """
+        data = job["data"]
+        if data["verdict"] == "verified":
+            self.result_cache.put(
+                data["image_sha256"], job["file_unique_id"], data["trade_data"],
+                data["proof_hash"], data["proof_link"], data["anchor"], data.get("phash")
+            )
+        elif data["verdict"] == "fake":
+            self.result_cache.put(data["image_sha256"], job["file_unique_id"], data["trade_data"],
+                                  phash=data.get("phash"))
+
+    async def _confirm(self, job):
+        """Update the verdict once its anchoring transaction is mined or fails."""
+        text = job["data"]["text"]
+        try:
+            receipt = await self.receipt_tracker.track(job["data"]["tx_hash"])
+        except asyncio.TimeoutError:
+            # The tx may never have reached a node. Its nonce would then be a gap
+            # every later root waits behind, and the link in the cache leads nowhere.
+            await self.anchorer.resync()
+            self.result_cache.delete(job["data"]["image_sha256"])
+            await self._edit(job, f"{text}\n\n🐢 The chain is slow today, check the link in a bit! "
+                                  "If it never shows up, send it again 🔄")
+            return None
+        if receipt['status'] == 1:
+            await self._edit(job, f"{text}\n\n⛓️ Locked in on chain at block {receipt['blockNumber']} ✅")
+        else:
+            self.result_cache.delete(job["data"]["image_sha256"])
+            await self._edit(job, f"{text}\n\n⚠️ The chain bounced this one, send it again in a bit! 🔄")
+        return None
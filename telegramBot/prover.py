@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from collections import OrderedDict
+from prover_client import ProofRejected, ProverClient, ProverError, check_journal
+import metrics
+from farm import ProverFarm, RemoteProver, WorkerLost, PROVER_FARM_PORT
+from fair import FairQueue
+
+logger = logging.getLogger(__name__)
+
+# How many `host --serve` daemons may prove at the same time
+PROVER_WORKERS = int(os.getenv('PROVER_WORKERS', '2'))
+# How many jobs may wait for a free prover before we start turning people away
+PROVER_QUEUE_SIZE = int(os.getenv('PROVER_QUEUE_SIZE', '32'))
+# Seconds a single proof may take before we kill it
+PROVER_TIMEOUT = float(os.getenv('PROVER_TIMEOUT', '300'))
+PROVER_EXE = os.getenv('PROVER_EXE', './host')
+# Jobs that arrive within the window are proven together, up to the batch size
+PROVER_BATCH_SIZE = int(os.getenv('PROVER_BATCH_SIZE', '8'))
+PROVER_BATCH_WINDOW = float(os.getenv('PROVER_BATCH_WINDOW', '0.05'))
+# Proofs remembered in memory, and optionally a SQLite file to keep them across restarts
+PROOF_CACHE_SIZE = int(os.getenv('PROOF_CACHE_SIZE', '10000'))
+PROOF_CACHE_PATH = os.getenv('PROOF_CACHE_PATH')
+# Times a job is handed out before we give up on it when its prover keeps disappearing
+PROVER_MAX_ATTEMPTS = int(os.getenv('PROVER_MAX_ATTEMPTS', '3'))
+
+
+class ProverBusy(Exception):
+    """Raised when the prover queue is full."""
+
+
+class VerifierFailed(Exception):
+    """Our own receipt verifier broke, so a remote batch is retried rather than blamed on its worker."""
+
+
+class ProverTimeout(Exception):
+    """Raised when a proof takes longer than the per-job timeout."""
+
+
+class ProofCache:
+    """LRU cache of proof results keyed by the normalized host inputs.
+
+    The guest is deterministic, so the same (entry, current, pnl, lev) always
+    passes or always fails. The journal is a pass/fail bitmap for a whole
+    batch, though, so a stored proof hash is sha256 of the journal of the
+    batch the trade was first proven in: it proves this trade passed, next to
+    whatever else shared that batch. A stored value of None means the trade
+    failed verification, which is just as reusable.
+    """
+
+    def __init__(self, max_size=PROOF_CACHE_SIZE, path=PROOF_CACHE_PATH):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS proofs (key TEXT PRIMARY KEY, proof_hash TEXT)")
+
+    @staticmethod
+    def key(inputs):
+        return json.dumps(inputs)
+
+    def get(self, inputs):
+        """Return (hit, proof_hash)."""
+        key = self.key(inputs)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key]
+        if self.db:
+            row = self.db.execute("SELECT proof_hash FROM proofs WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._remember(key, row[0])
+                self.hits += 1
+                return True, row[0]
+        self.misses += 1
+        return False, None
+
+    def put(self, inputs, proof_hash):
+        key = self.key(inputs)
+        self._remember(key, proof_hash)
+        if self.db:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO proofs (key, proof_hash) VALUES (?, ?)", (key, proof_hash)
+                )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+    def _remember(self, key, proof_hash):
+        self._entries[key] = proof_hash
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class ProverPool:
+    """Runs proof jobs on warm prover daemons, local and (with a farm) remote.
+
+    Local `host --serve` daemons and every slot of a connected farm worker
+    pull batches from one queue, so capacity grows as workers join.
+    """
+
+    def __init__(self, workers=PROVER_WORKERS, queue_size=PROVER_QUEUE_SIZE,
+                 timeout=PROVER_TIMEOUT, exe_path=PROVER_EXE, cache=None,
+                 batch_size=PROVER_BATCH_SIZE, batch_window=PROVER_BATCH_WINDOW,
+                 farm_port=PROVER_FARM_PORT, max_attempts=PROVER_MAX_ATTEMPTS):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.exe_path = exe_path
+        self.max_attempts = max_attempts
+        self.cache = cache if cache is not None else ProofCache()
+        self.farm = ProverFarm(self, port=farm_port) if farm_port else None
+        # Identical jobs already queued or proving share one future
+        self._inflight = {}
+        self._queue = None
+        # Prover task -> name, one per local daemon or remote worker slot
+        self._provers = {}
+        self._clients = []
+        # Checks receipts from farm workers; started with the farm
+        self._verifier = None
+        self._active = 0
+
+    async def start(self):
+        # Unbounded so jobs from a lost worker can always go back; submit() enforces the limit.
+        # Batches are filled fairly across chats so one chat's backlog can't hog the provers.
+        self._queue = FairQueue(key=lambda item: item[3])
+        self._clients = [ProverClient(self.exe_path) for _ in range(self.workers)]
+        for i, client in enumerate(self._clients):
+            await client.start()
+            self.add_prover(client, f"local-{i}")
+        if self.farm:
+            await self.farm.start()
+            if self.farm.verify:
+                self._verifier = ProverClient(self.exe_path)
+                await self._verifier.start()
+        logger.info(f"Started prover pool with {self.workers} local workers")
+
+    async def stop(self):
+        if self.farm:
+            await self.farm.stop()
+        tasks = list(self._provers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._provers = {}
+        for client in self._clients:
+            await client.stop()
+        self._clients = []
+        if self._verifier:
+            await self._verifier.stop()
+            self._verifier = None
+
+    @property
+    def capacity(self):
+        return len(self._provers)
+
+    def add_prover(self, prover, name):
+        """Start pulling batches for anything with a ProverClient-style prove_batch()."""
+        task = asyncio.create_task(self._worker(prover, name))
+        self._provers[task] = name
+        return task
+
+    def remove_prover(self, task):
+        # The task puts back whatever it was holding when it gets cancelled
+        task.cancel()
+        self._provers.pop(task, None)
+
+    def submit(self, entry, current, pnl, lev, key=None):
+        """Queue a proof. Returns (future, jobs queued when it was submitted).
+
+        Inputs must already be normalized and have passed precheck_pnl; the
+        pipeline's precheck stage owns both, so they aren't repeated here.
+        The future resolves to the batch proof hash (shared by every trade
+        proven alongside this one), or None if the trade didn't verify.
+        `key` (the chat) is what the queue shares provers fairly between.
+        """
+        inputs = (entry, current, pnl, lev)
+        hit, proof_hash = self.cache.get(inputs)
+        if hit:
+            return self._resolved(proof_hash), 0
+        if inputs in self._inflight:
+            return self._inflight[inputs], 0
+
+        ahead = self._queue.qsize()
+        if ahead >= self.queue_size:
+            raise ProverBusy(f"prover queue is full ({self.queue_size} jobs)")
+        if self._active >= self.capacity:
+            ahead += 1
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((future, inputs, 1, key))
+        self._inflight[inputs] = future
+        future.add_done_callback(lambda _: self._inflight.pop(inputs, None))
+        return future, ahead
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "active": self._active,
+            "workers": self.capacity,
+            "remote_workers": len(self.farm.workers) if self.farm else 0,
+            "cache": self.cache.stats(),
+        }
+
+    @staticmethod
+    def _resolved(proof_hash):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(proof_hash)
+        return future
+
+    async def _next_batch(self):
+        """Wait for one job, then gather whatever else arrives within the batch window."""
+        batch = [await self._queue.get()]
+        try:
+            deadline = asyncio.get_running_loop().time() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            self._requeue(batch, count_attempt=False)
+            raise
+        return batch
+
+    def _requeue(self, batch, count_attempt=True):
+        for future, inputs, attempts, key in batch:
+            self._queue.task_done()
+            if future.done():
+                continue
+            if count_attempt:
+                attempts += 1
+            if attempts > self.max_attempts:
+                future.set_exception(ProverError(f"gave up after {self.max_attempts} lost provers"))
+                continue
+            self._queue.put_nowait((future, inputs, attempts, key))
+
+    async def _check_remote(self, prover, name, trades, result):
+        """Make sure a farm worker's result is a real proof of these trades."""
+        try:
+            check_journal(trades, result)
+            if self._verifier:
+                if not result.get("receipt"):
+                    raise ProofRejected("result has no receipt")
+                verified = await self._verifier.verify(result["receipt"], timeout=self.timeout)
+                if verified["proof_hash"] != result["proof_hash"]:
+                    raise ProofRejected("receipt proves a different journal")
+        except ProofRejected as e:
+            logger.error(f"Prover {name} sent a proof that doesn't hold up, dropping it: {str(e)}")
+            prover.close()
+            raise WorkerLost(f"worker {prover.name} sent a bad proof: {str(e)}")
+        except (ProverError, asyncio.TimeoutError) as e:
+            # The verifier daemon is shared, so one timeout restarts it under every
+            # pending check; none of that says anything about the workers
+            raise VerifierFailed(f"couldn't verify the receipt: {str(e) or type(e).__name__}")
+
+    async def _worker(self, prover, name):
+        # Remote provers close for good when their worker leaves
+        while not getattr(prover, "closed", False):
+            batch = await self._next_batch()
+            self._active += 1
+            try:
+                jobs = [(future, args) for future, args, *_ in batch if not future.cancelled()]
+                if not jobs:
+                    continue
+                metrics.PROVER_BATCH_TRADES.observe(len(jobs))
+                trades = [args for _, args in jobs]
+                remote = isinstance(prover, RemoteProver)
+                started = time.monotonic()
+                try:
+                    result = await prover.prove_batch(
+                        trades, timeout=self.timeout, receipt=remote and self._verifier is not None
+                    )
+                except asyncio.TimeoutError:
+                    metrics.PROVER_SECONDS.labels("timeout").observe(time.monotonic() - started)
+                    raise
+                except Exception:
+                    metrics.PROVER_SECONDS.labels("error").observe(time.monotonic() - started)
+                    raise
+                metrics.PROVER_SECONDS.labels("ok").observe(time.monotonic() - started)
+                if len(result["results"]) != len(jobs):
+                    # zip() would leave the rest of the batch waiting forever
+                    raise ProverError(f"got {len(result['results'])} results for {len(jobs)} trades")
+                if remote:
+                    await self._check_remote(prover, name, trades, result)
+                for (future, args), verified in zip(jobs, result["results"]):
+                    proof_hash = result["proof_hash"] if verified else None
+                    self.cache.put(args, proof_hash)
+                    if not future.done():
+                        future.set_result(proof_hash)
+                logger.info(f"Prover {name} proved a batch of {len(jobs)}")
+            except asyncio.CancelledError:
+                # Stopped or its worker left mid-batch; someone else can take it
+                self._requeue(batch, count_attempt=False)
+                batch = []
+                raise
+            except (WorkerLost, VerifierFailed) as e:
+                logger.warning(f"Prover {name} lost a batch of {len(batch)}, requeueing: {str(e)}")
+                self._requeue(batch)
+                batch = []
+            except asyncio.TimeoutError:
+                logger.error(f"Prover {name} timed out after {self.timeout}s on a batch of {len(batch)}")
+                for future, *_ in batch:
+                    if not future.done():
+                        future.set_exception(ProverTimeout(f"proof took longer than {self.timeout}s"))
+            except Exception as e:
+                logger.error(f"Prover {name} failed: {str(e)}")
+                for future, *_ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self._active -= 1
+                for _ in range(len(batch)):
+                    self._queue.task_done()
@@ -0,0 +1,186 @@
+import json
+import struct
+import asyncio
+import hashlib
+
+# No chain dependencies here: remote prover workers import this module alone
+
+
+class ProverError(Exception):
+    """Raised when the prover daemon fails for reasons other than a rejected trade."""
+
+
+class ProofRejected(ProverError):
+    """Raised when a proof from elsewhere was checked and doesn't hold up."""
+
+
+def encode_journal(inputs, results):
+    """Inverse of decode_journal(), for stand-in provers and tests."""
+    words = [len(inputs)] + [struct.unpack('<I', struct.pack('<f', x))[0] for x in inputs]
+    words += [len(results)] + [int(bool(r)) for r in results]
+    return struct.pack(f"<{len(words)}I", *words).hex()
+
+
+def decode_journal(journal_hex):
+    """Split a journal into (inputs, results).
+
+    The guest commits (Vec<f32>, Vec<bool>) with risc0's serde, which writes
+    every length, f32 and bool as one little-endian u32 word.
+    """
+    data = bytes.fromhex(journal_hex)
+    words = struct.unpack(f"<{len(data) // 4}I", data[:len(data) - len(data) % 4])
+    if len(data) % 4 or not words:
+        raise ValueError("journal is not a whole number of words")
+    count = words[0]
+    if len(words) < 2 + count or words[1 + count] != len(words) - 2 - count:
+        raise ValueError("journal doesn't decode as (Vec<f32>, Vec<bool>)")
+    inputs = [struct.unpack('<f', struct.pack('<I', w))[0] for w in words[1:1 + count]]
+    results = words[2 + count:]
+    if any(r > 1 for r in results):
+        raise ValueError("journal holds a bool that isn't 0 or 1")
+    return inputs, [bool(r) for r in results]
+
+
+def check_journal(trades, result):
+    """Raise ProofRejected unless a prove_batch() result really covers `trades`.
+
+    The journal has to hash to proof_hash, hold exactly these inputs as the
+    host passed them (lev as f32), and agree with the reported results.
+    """
+    journal = result.get("journal")
+    if not journal:
+        raise ProofRejected("result has no journal")
+    # The result comes from an untrusted worker, so bad hex or a missing
+    # field is a bad proof like any other
+    try:
+        if hashlib.sha256(bytes.fromhex(journal)).hexdigest() != result["proof_hash"]:
+            raise ProofRejected("proof hash doesn't match the journal")
+        inputs, results = decode_journal(journal)
+        reported = list(result["results"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ProofRejected(f"malformed result: {str(e) or type(e).__name__}")
+    expected = [struct.unpack('<f', struct.pack('<f', float(x)))[0] for trade in trades for x in trade]
+    if inputs != expected:
+        raise ProofRejected("journal was proven for different trades")
+    if results != reported:
+        raise ProofRejected("results don't match the journal")
+
+
+class ProverClient:
+    """Client for a long-lived `host --serve` process.
+
+    Jobs go to the daemon's stdin as newline-delimited JSON and come back on
+    stdout tagged with the same id, so several can be in flight at once while
+    the prover stays warm between them.
+    """
+
+    def __init__(self, exe_path="./host"):
+        self.exe_path = exe_path
+        self._proc = None
+        self._reader = None
+        self._pending = {}
+        self._next_id = 0
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            if self._proc and self._proc.returncode is None:
+                return
+            self._proc = await asyncio.create_subprocess_exec(
+                self.exe_path, "--serve",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                # Receipts come back as a single (long) line
+                limit=64 * 1024 * 1024,
+            )
+            self._reader = asyncio.create_task(self._read_responses(self._proc))
+
+    async def stop(self):
+        proc = self._proc
+        self._proc = None
+        if proc and proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        self._fail_pending(ProverError("prover stopped"))
+
+    async def prove_batch(self, trades, timeout=None, receipt=False):
+        """Prove several (entry, current, pnl, lev) trades in one receipt.
+
+        Returns a dict with results (one bool per trade), proof_hash, and the
+        receipt if asked for.
+        """
+        return await self._request({
+            "trades": [
+                {"entry": entry, "current": current, "pnl": pnl, "lev": lev}
+                for entry, current, pnl, lev in trades
+            ],
+            "receipt": receipt,
+        }, timeout)
+
+    async def verify(self, receipt, timeout=None):
+        """Check a hex receipt from elsewhere against the guest's image ID.
+
+        Returns the same dict as prove_batch() for the batch it proves;
+        raises ProofRejected if it doesn't verify, and ProverError if the
+        daemon itself failed.
+        """
+        return await self._request({"verify": receipt}, timeout, rejected=ProofRejected)
+
+    async def _request(self, request, timeout, rejected=ProverError):
+        await self.start()
+        self._next_id += 1
+        job_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = future
+        self._proc.stdin.write((json.dumps({"id": job_id, **request}) + "\n").encode())
+        try:
+            await self._proc.stdin.drain()
+            response = await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # The daemon is stuck on this job; restart it rather than wait
+            await self.stop()
+            raise
+        finally:
+            self._pending.pop(job_id, None)
+
+        if response["status"] != "ok":
+            raise rejected(response.get("error", "unknown prover error"))
+        return {
+            "results": response["results"],
+            "proof_hash": response["proof_hash"],
+            "journal": response.get("journal"),
+            "receipt": response.get("receipt"),
+        }
+
+    async def prove(self, entry, current, pnl, lev, timeout=None, receipt=False):
+        """Prove one trade. Returns a dict with proof_hash (and receipt if asked),
+        or None if the guest rejected the trade."""
+        result = await self.prove_batch([(entry, current, pnl, lev)], timeout=timeout, receipt=receipt)
+        if not result["results"][0]:
+            return None
+        return {"proof_hash": result["proof_hash"], "receipt": result["receipt"]}
+
+    async def _read_responses(self, proc):
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            future = self._pending.get(response.get("id"))
+            if future and not future.done():
+                future.set_result(response)
+        if self._proc is proc:
+            self._proc = None
+        self._fail_pending(ProverError(f"prover exited with code {await proc.wait()}"))
+
+    def _fail_pending(self, error):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Remote prover worker: runs `host --serve` daemons and proves jobs for a bot's prover farm.
+
+Run it on any Linux box with the host binary:
+
+    PROVER_FARM_ADDR=bot.internal:7000 PROVER_FARM_TOKEN=... PROVER_WORKER_CAPACITY=4 python prover_worker.py
+
+It reconnects with backoff whenever the bot goes away, so workers and the
+bot can restart independently.
+"""
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+from prover_client import ProverClient
+from farm import LINE_LIMIT, send
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# host:port of the bot's prover farm, and the token it expects
+PROVER_FARM_ADDR = os.getenv('PROVER_FARM_ADDR', '127.0.0.1:7000')
+PROVER_FARM_TOKEN = os.getenv('PROVER_FARM_TOKEN', '')
+PROVER_WORKER_NAME = os.getenv('PROVER_WORKER_NAME', socket.gethostname())
+# Prover daemons to run here, usually one per few cores
+PROVER_WORKER_CAPACITY = int(os.getenv('PROVER_WORKER_CAPACITY', '1'))
+PROVER_EXE = os.getenv('PROVER_EXE', './host')
+# Seconds between reconnect attempts, doubling up to the max
+RECONNECT_MIN = float(os.getenv('PROVER_WORKER_RECONNECT_MIN', '1'))
+RECONNECT_MAX = float(os.getenv('PROVER_WORKER_RECONNECT_MAX', '30'))
+
+
+async def prove(clients, writer, job):
+    client = await clients.get()
+    try:
+        result = await client.prove_batch(job["trades"], receipt=job.get("receipt", False))
+        response = {"type": "result", "id": job["id"], "status": "ok", **result}
+    except Exception as e:
+        logger.error(f"Job {job['id']} failed: {str(e)}")
+        response = {"type": "result", "id": job["id"], "status": "error", "error": str(e)}
+    finally:
+        clients.put_nowait(client)
+    try:
+        await send(writer, response)
+    except (ConnectionError, OSError):
+        # The bot already requeued this job when the connection dropped
+        pass
+
+
+async def session(clients, host, port):
+    reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+    try:
+        await send(writer, {
+            "type": "hello",
+            "name": PROVER_WORKER_NAME,
+            "token": PROVER_FARM_TOKEN,
+            "capacity": PROVER_WORKER_CAPACITY,
+        })
+        welcome = await reader.readline()
+        if not welcome or json.loads(welcome).get("type") != "welcome":
+            raise ConnectionError("the farm turned us away, check PROVER_FARM_TOKEN")
+        logger.info(f"Registered with {host}:{port} as {PROVER_WORKER_NAME} (capacity {PROVER_WORKER_CAPACITY})")
+
+        jobs = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("the farm closed the connection")
+            message = json.loads(line)
+            if message.get("type") == "ping":
+                await send(writer, {"type": "pong"})
+            elif message.get("type") == "job":
+                task = asyncio.create_task(prove(clients, writer, message))
+                jobs.add(task)
+                task.add_done_callback(jobs.discard)
+    finally:
+        writer.close()
+
+
+async def main():
+    host, port = PROVER_FARM_ADDR.rsplit(":", 1)
+    clients = asyncio.Queue()
+    for _ in range(PROVER_WORKER_CAPACITY):
+        client = ProverClient(PROVER_EXE)
+        await client.start()
+        clients.put_nowait(client)
+
+    delay = RECONNECT_MIN
+    while True:
+        started = time.monotonic()
+        try:
+            await session(clients, host, int(port))
+        except (ConnectionError, OSError, ValueError) as e:
+            logger.warning(f"Farm connection failed: {str(e)}")
+        # A session that held up for a while wasn't part of an outage
+        if time.monotonic() - started > RECONNECT_MAX:
+            delay = RECONNECT_MIN
+        # Jittered so a fleet doesn't reconnect in lockstep after a bot restart
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+        delay = min(RECONNECT_MAX, delay * 2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
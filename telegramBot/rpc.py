@@ -1,77 +1,447 @@
-import subprocess
-from web3 import Web3
+import os
+import asyncio
+import logging
+import functools
+from eth_account import Account
+from web3 import AsyncWeb3
 from pathlib import Path
+from transport import FailoverProvider
+from prover_client import ProverClient
+import metrics
 from os.path import join as path_join
 import json
+import math
+import struct
 import hashlib
 
-rpc_url = "https://zircuit1-testnet.p2pify.com"
-w3 = Web3(Web3.HTTPProvider(rpc_url))
+logger = logging.getLogger(__name__)
 
-def create_contract(w3, addr):
+# Endpoints, timeouts and pooling are configured in transport.py
+w3 = AsyncWeb3(FailoverProvider())
+
+# Override these to point the bot at another deployment, e.g. a local anvil chain
+chain_id = int(os.getenv('CHAIN_ID', '48899'))
+# A ProofVerifier deployed from contracts/src with addProofRoot. The original
+# testnet deployment only has addProofHash, so there is no default to fall back to.
+contract_address = os.getenv('CONTRACT_ADDRESS')
+# One process per key; see NonceManager
+sender_pk = os.getenv('SENDER_PK', "0xd0e14fb3701cf1440a3ab7982148ab6ac24628ca6b203714c7fa7c68b6422bf2")
+explorer_url = os.getenv('EXPLORER_URL', "https://explorer.testnet.zircuit.com/tx/0x")
+
+# Seconds between receipt polls, and how long to wait for a tx to be mined
+RECEIPT_POLL_INTERVAL = float(os.getenv('RECEIPT_POLL_INTERVAL', '2'))
+RECEIPT_TIMEOUT = float(os.getenv('RECEIPT_TIMEOUT', '300'))
+# Reads issued within this many seconds of each other share one JSON-RPC batch
+RPC_BATCH_WINDOW = float(os.getenv('RPC_BATCH_WINDOW', '0.01'))
+RPC_BATCH_SIZE = int(os.getenv('RPC_BATCH_SIZE', '100'))
+# Seconds a fetched gas price is reused before asking the node again
+GAS_PRICE_TTL = float(os.getenv('GAS_PRICE_TTL', '10'))
+# Seconds to wait before sending a tx again after every endpoint failed on it
+TX_REBROADCAST_DELAY = float(os.getenv('TX_REBROADCAST_DELAY', '1'))
+
+@functools.lru_cache(maxsize=None)
+def load_abi(name="ProofVerifier"):
+    # Read once per process; the ABI doesn't change while the bot runs
     root = str(Path(__file__).parent.parent.absolute())
-    j = path_join(root, "contracts/out", "ProofVerifier.sol", "ProofVerifier.json")
+    j = path_join(root, "contracts/out", f"{name}.sol", f"{name}.json")
     with open(j) as f:
-        abi = json.load(f)["abi"]
-    return w3.eth.contract(address=addr, abi=abi)
-
-def invoke_contract(w3, contract, method, args, sender_pk, chain_id=48899, gas=2e6):
-    sender_addr = w3.eth.account.from_key(sender_pk).address
-    txn = contract.functions[method](*args).build_transaction({
-        'from': sender_addr,
-        # 'gas': int(gas),
-        'gasPrice': w3.eth.gas_price,
-        'nonce': w3.eth.get_transaction_count(sender_addr),
-        'chainId': chain_id
-    })
-    signed_txn = w3.eth.account.sign_transaction(txn, private_key=sender_pk)
-    tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-    tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    return tx_hash, tx_receipt
-
-def get_method(contract, method, args):
-    return contract.functions[method](*args).call()
-
-def post_to_sc(proof_hash):
-    contract_address = "0xCC497f66EBE70Fd4f8757287E800DD5DDc467848"
+        return json.load(f)["abi"]
+
+_contracts = {}
+
+def create_contract(w3, addr):
+    # Contract wrappers are reused per (provider, address)
+    key = (id(w3), addr)
+    if key not in _contracts:
+        _contracts[key] = w3.eth.contract(address=addr, abi=load_abi())
+    return _contracts[key]
+
+@functools.lru_cache(maxsize=None)
+def get_account(private_key):
+    # Deriving the address from the key is not free, so do it once per key
+    return Account.from_key(private_key)
+
+class NonceManager:
+    """Hands out nonces for one sender without asking the chain every time.
+
+    The pending transaction count is fetched once; after that nonces are
+    allocated locally under a lock so concurrent sends never share one.
+    resync() drops the local counter when the node disagrees with it.
+
+    This assumes one process per SENDER_PK. Replicas sharing a key hand out
+    the same nonces and keep knocking each other's transactions out, so give
+    each replica its own sender key.
+    """
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._nonce = None
+        self._lock = asyncio.Lock()
+
+    async def next(self):
+        async with self._lock:
+            if self._nonce is None:
+                self._nonce = await self.w3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self._nonce
+            self._nonce += 1
+            return nonce
+
+    async def resync(self):
+        async with self._lock:
+            self._nonce = None
+
+
+class GasPriceCache:
+    """Gas price reused for a few seconds instead of fetched per transaction."""
+
+    def __init__(self, w3, ttl=GAS_PRICE_TTL):
+        self.w3 = w3
+        self.ttl = ttl
+        self._price = None
+        self._expires = 0
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._price is None or now >= self._expires:
+                self._price = await self.w3.eth.gas_price
+                self._expires = now + self.ttl
+            return self._price
+
+
+_nonce_managers = {}
+_gas_prices = {}
+
+def nonce_manager(w3, address):
+    key = (id(w3), address)
+    if key not in _nonce_managers:
+        _nonce_managers[key] = NonceManager(w3, address)
+    return _nonce_managers[key]
+
+def gas_price_cache(w3):
+    if id(w3) not in _gas_prices:
+        _gas_prices[id(w3)] = GasPriceCache(w3)
+    return _gas_prices[id(w3)]
+
+def raw_transaction(signed_txn):
+    """Encoded bytes of a signed tx under any eth-account version.
+
+    eth-account only has raw_transaction from 0.13 on; the 0.11 that
+    web3==6.11.3 pins has rawTransaction, so the attribute alone raised
+    AttributeError on every send.
+    """
+    raw = getattr(signed_txn, "raw_transaction", None)
+    return raw if raw is not None else signed_txn.rawTransaction
+
+# Errors meaning the nonce was already used, so the tx was definitely not accepted
+NONCE_TOO_LOW = "nonce too low"
+NONCE_ERRORS = (NONCE_TOO_LOW, "replacement transaction underpriced")
+# The node already has this exact tx, e.g. from an endpoint that timed out before failover
+ALREADY_KNOWN = "already known"
+
+async def resync_nonce():
+    """Forget our sender's local nonce, e.g. after one of its txs never showed up."""
+    await nonce_manager(w3, get_account(sender_pk).address).resync()
+
+async def invoke_contract(w3, contract, method, args, sender_pk, chain_id=chain_id, gas=2e6, retries=2):
+    """Sign and send a transaction. Returns the tx hash without waiting for it to be mined.
+
+    A tx is only re-signed with a fresh nonce when the node says its nonce was
+    taken. When every endpoint fails we can't tell whether the node got it, so
+    the same signed bytes go out once more: a node that has it answers
+    "already known", one that doesn't takes it now. If that fails too the
+    nonce is handed back and the error raised, since a tx that never arrived
+    would leave a gap every later nonce waits behind.
+    """
+    account = get_account(sender_pk)
+    sender_addr = account.address
+    nonces = nonce_manager(w3, sender_addr)
+    for attempt in range(retries + 1):
+        nonce = await nonces.next()
+        try:
+            txn = await contract.functions[method](*args).build_transaction({
+                'from': sender_addr,
+                # 'gas': int(gas),
+                'gasPrice': await gas_price_cache(w3).get(),
+                'nonce': nonce,
+                'chainId': chain_id
+            })
+            signed_txn = account.sign_transaction(txn)
+        except Exception:
+            # Never sent, so the nonce would be a gap
+            await nonces.resync()
+            raise
+        raw = raw_transaction(signed_txn)
+        try:
+            return await w3.eth.send_raw_transaction(raw)
+        except ConnectionError as e:
+            logger.warning(f"Sending tx {tx_hex(signed_txn.hash)} failed ({str(e)}), rebroadcasting it")
+            await asyncio.sleep(TX_REBROADCAST_DELAY)
+            try:
+                return await w3.eth.send_raw_transaction(raw)
+            except Exception as e:
+                message = str(e).lower()
+                # With one process per key, nothing but this tx can have used its nonce
+                if ALREADY_KNOWN in message or NONCE_TOO_LOW in message:
+                    return signed_txn.hash
+                await nonces.resync()
+                raise
+        except Exception as e:
+            message = str(e).lower()
+            if ALREADY_KNOWN in message:
+                return signed_txn.hash
+            # Rejected outright, so the nonce is still free; start over from the chain
+            await nonces.resync()
+            if attempt == retries or not any(err in message for err in NONCE_ERRORS):
+                raise
+            logger.warning(f"Nonce {nonce} rejected ({str(e)}), resyncing and retrying")
+
+class RpcBatcher:
+    """Coalesces concurrent JSON-RPC reads into batch requests.
+
+    Calls made within RPC_BATCH_WINDOW of each other (up to RPC_BATCH_SIZE)
+    go out in a single HTTP round trip through the provider's
+    make_batch_request.
+    """
+
+    def __init__(self, provider, window=RPC_BATCH_WINDOW, max_size=RPC_BATCH_SIZE):
+        self.provider = provider
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+        # Sends in flight; the loop only keeps weak references to tasks
+        self._tasks = set()
+
+    async def call(self, method, params):
+        """Queue a call and wait for its result; JSON-RPC errors raise ValueError."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((method, params, future))
+        if len(self._pending) >= self.max_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            responses = await self.provider.make_batch_request([(method, params) for method, params, _ in batch])
+        except Exception as e:
+            logger.warning(f"RPC batch of {len(batch)} calls failed: {str(e)}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), response in zip(batch, responses):
+            if future.done():
+                continue
+            if "error" in response:
+                future.set_exception(ValueError(response["error"]))
+            else:
+                future.set_result(response.get("result"))
+
+
+batcher = RpcBatcher(w3.provider)
+
+async def get_method(contract, method, args, sender=None):
+    """Call a view function through the batcher, so concurrent calls share a round trip.
+
+    The call is made from `sender` (our account by default), since views like
+    verifyProofHash depend on msg.sender.
+    """
+    sender = sender or get_account(sender_pk).address
+    call = {"from": sender, "to": contract.address, "data": contract.encodeABI(fn_name=method, args=args)}
+    result = await batcher.call("eth_call", [call, "latest"])
+    if not result or result == "0x":
+        # No code at the address, or a revert without data
+        raise ValueError(f"{method} at {contract.address} returned no data")
+    entry = next(
+        item for item in contract.abi
+        if item.get("type") == "function" and item["name"] == method and len(item["inputs"]) == len(args)
+    )
+    values = w3.codec.decode([output["type"] for output in entry["outputs"]], bytes.fromhex(result[2:]))
+    return values[0] if len(values) == 1 else values
+
+def tx_hex(tx_hash):
+    # 0x-prefixed hex whether we got HexBytes, bytes or a string
+    if isinstance(tx_hash, str):
+        return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+    return "0x" + bytes(tx_hash).hex()
+
+def tx_link(tx_hash):
+    return f"{explorer_url}{tx_hex(tx_hash)[2:]}"
+
+def proof_leaf(proof_hash):
+    # What goes on chain for a proof: sha256 of its hex hash string
+    return hashlib.sha256(proof_hash.encode()).digest()
+
+async def post_to_sc(proof_hash):
+    contract = create_contract(w3, contract_address)
+    tx_hash = await invoke_contract(
+        w3,
+        contract, "addProofHash", [proof_leaf(proof_hash)],
+        sender_pk,
+    )
+    return tx_hash
+
+async def post_root_to_sc(root, leaf_count):
     contract = create_contract(w3, contract_address)
-    tx_hash, tx_receipt = invoke_contract(
+    tx_hash = await invoke_contract(
         w3,
-        contract, "addProofHash", [hashlib.sha256(proof_hash.encode()).digest()],
-        "0xd0e14fb3701cf1440a3ab7982148ab6ac24628ca6b203714c7fa7c68b6422bf2",
+        contract, "addProofRoot", [root, leaf_count],
+        sender_pk,
     )
-    return f"https://explorer.testnet.zircuit.com/tx/0x{tx_receipt['transactionHash'].hex()}"
+    return tx_hash
+
+
+def format_receipt(raw):
+    # Raw JSON-RPC receipts carry hex quantities; convert the ones we read
+    receipt = dict(raw)
+    for field in ("status", "blockNumber", "gasUsed", "effectiveGasPrice"):
+        if isinstance(receipt.get(field), str):
+            receipt[field] = int(receipt[field], 16)
+    return receipt
+
+
+class ReceiptTracker:
+    """Polls receipts for every outstanding transaction on one shared timer.
+
+    Each poll is a single JSON-RPC batch however many transactions are
+    pending. track() returns a future that resolves to the receipt once the
+    tx is mined, or fails with TimeoutError after RECEIPT_TIMEOUT seconds.
+    """
+
+    def __init__(self, batcher=batcher, interval=RECEIPT_POLL_INTERVAL, timeout=RECEIPT_TIMEOUT):
+        self.batcher = batcher
+        self.interval = interval
+        self.timeout = timeout
+        self._pending = {}
+        self._task = None
 
-def run_rust_exe(exe_path, *args):
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def track(self, tx_hash):
+        loop = asyncio.get_running_loop()
+        tx_hash = tx_hex(tx_hash)
+        if tx_hash in self._pending:
+            return self._pending[tx_hash][0]
+        future = loop.create_future()
+        self._pending[tx_hash] = (future, loop.time() + self.timeout)
+        return future
+
+    async def _fetch(self, tx_hash):
+        # A pending transaction has a null receipt
+        receipt = await self.batcher.call("eth_getTransactionReceipt", [tx_hash])
+        return format_receipt(receipt) if receipt else None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._pending:
+                continue
+            tx_hashes = list(self._pending)
+            receipts = await asyncio.gather(*(self._fetch(h) for h in tx_hashes), return_exceptions=True)
+            now = asyncio.get_running_loop().time()
+            for tx_hash, receipt in zip(tx_hashes, receipts):
+                future, deadline = self._pending[tx_hash]
+                if isinstance(receipt, Exception):
+                    logger.warning(f"Receipt poll for {tx_hash} failed: {str(receipt)}")
+                    receipt = None
+                if receipt is not None:
+                    del self._pending[tx_hash]
+                    metrics.TRANSACTIONS.labels(str(receipt.get("status"))).inc()
+                    gas_used = receipt.get("gasUsed") or 0
+                    metrics.GAS_USED.inc(gas_used)
+                    metrics.GAS_SPENT_WEI.inc(gas_used * (receipt.get("effectiveGasPrice") or 0))
+                    if not future.done():
+                        future.set_result(receipt)
+                elif now > deadline:
+                    del self._pending[tx_hash]
+                    if not future.done():
+                        future.set_exception(asyncio.TimeoutError(f"{tx_hash} not mined after {self.timeout}s"))
+
+def to_f32(x):
+    # Round a Python float to the nearest f32, the type the guest works in
+    x = float(x)
     try:
-        # Run the Rust executable and pass command-line arguments
-        result = subprocess.run(
-            [exe_path, *map(str, args)],  # Convert all args to strings
-            stdout=subprocess.PIPE,      # Capture standard output
-            stderr=subprocess.PIPE,      # Capture standard error
-            text=True,                   # Return output as string
-            check=True                   # Raise an exception on non-zero exit
-        )
-        return result.stdout.strip()  # Return the output
-    except subprocess.CalledProcessError as e:
-        print(f"Error: {e.stderr.strip()}")
-        return None
-
-def call_zk(entry, current, pnl, lev):
-    exe_path = "./host"  # Replace with the path to your Rust executable
-    args = [entry, current, pnl, lev]          # Arguments to pass to the Rust executable
-
-    output = run_rust_exe(exe_path, *args)
-    if "proof hash:" in output:
-        return output.split("proof hash:")[1].strip()
-
-    return None
-    
+        return struct.unpack('<f', struct.pack('<f', x))[0]
+    except OverflowError:
+        # Rust parses out-of-range numbers as infinity
+        return math.copysign(math.inf, x)
 
+U32_MAX = 2**32 - 1
 
-if __name__ == "__main__":
-    proof_hash_to_post = call_zk(100.0, 120.0, 20.0, 1)
+def normalize_zk_inputs(entry, current, pnl, lev):
+    """Return the inputs exactly as the host will see them: three f32s and a u32 leverage."""
+    lev = float(lev)
+    if not lev.is_integer() or not 0 <= lev <= U32_MAX:
+        # The host parses lev as u32 and rejects anything else
+        raise ValueError(f"Leverage must be a whole number that fits in a u32, got {lev}")
+    inputs = to_f32(entry), to_f32(current), to_f32(pnl), int(lev)
+    if not all(math.isfinite(x) for x in inputs):
+        raise ValueError(f"Inputs must be finite, got {inputs}")
+    return inputs
+
+def _f32_div(a, b):
+    # IEEE division; Python raises on zero where the guest gets inf/NaN
+    if b == 0:
+        if a == 0 or math.isnan(a):
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return to_f32(a / b)
+
+def precheck_pnl(entry, current, pnl, lev):
+    """Run the guest's PnL check in f32 arithmetic without proving.
+
+    Takes normalized inputs. Returns False exactly when the guest would panic.
+    Each step is a double operation on f32 values rounded back to f32, which
+    matches single-precision IEEE results for +, -, * and /.
+    """
+    lev = to_f32(lev)
+    pnl_calculated = to_f32(to_f32(_f32_div(to_f32(current - entry), entry) * 100.0) * lev)
+    error_margin = to_f32(to_f32(0.15) * abs(pnl))
+    # NaN compares false here, just like in the guest
+    return not abs(to_f32(pnl - pnl_calculated)) > error_margin
+
+
+async def call_zk(entry, current, pnl, lev):
+    client = ProverClient()
+    try:
+        result = await client.prove(*normalize_zk_inputs(entry, current, pnl, lev))
+        return result["proof_hash"] if result else None
+    finally:
+        await client.stop()
+
+
+async def main():
+    proof_hash_to_post = await call_zk(100.0, 120.0, 20.0, 1)
     if proof_hash_to_post:
-        print(post_to_sc(proof_hash_to_post))
+        tx_hash = await post_to_sc(proof_hash_to_post)
+        await w3.eth.wait_for_transaction_receipt(tx_hash)
+        print(tx_link(tx_hash))
     else:
-        print("Error: Could not generate proof hash")
\ No newline at end of file
+        print("Error: Could not generate proof hash")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import logging
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between edits in one chat. Telegram allows about one message
+# per second in a private chat and twenty per minute in a group.
+STATUS_PRIVATE_INTERVAL = float(os.getenv('STATUS_PRIVATE_INTERVAL', '1'))
+STATUS_GROUP_INTERVAL = float(os.getenv('STATUS_GROUP_INTERVAL', '3'))
+
+# Past deadlines are dropped once this many chats have one
+SWEEP_AT = 1000
+
+
+class StatusEditor:
+    """Edits status messages as fast as Telegram allows and no faster.
+
+    Each message only keeps its newest pending text, so a burst of progress
+    updates collapses into one edit instead of queueing up behind the rate
+    limit. set() returns a future that resolves once that text (or a newer
+    one) has been shown.
+    """
+
+    def __init__(self, bot, private_interval=STATUS_PRIVATE_INTERVAL, group_interval=STATUS_GROUP_INTERVAL):
+        self.bot = bot
+        self.private_interval = private_interval
+        self.group_interval = group_interval
+        # chat_id -> {message_id: (text, [futures])}
+        self._pending = {}
+        self._next_edit = {}
+        self._flushers = {}
+
+    def set(self, chat_id, message_id, text):
+        future = asyncio.get_running_loop().create_future()
+        messages = self._pending.setdefault(chat_id, {})
+        _, waiters = messages.get(message_id, (None, []))
+        waiters.append(future)
+        messages[message_id] = (text, waiters)
+        if chat_id not in self._flushers:
+            self._flushers[chat_id] = asyncio.create_task(self._flush(chat_id))
+        return future
+
+    def _interval(self, chat_id):
+        # Group and channel ids are negative
+        return self.group_interval if chat_id < 0 else self.private_interval
+
+    async def _flush(self, chat_id):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending.get(chat_id):
+                delay = self._next_edit.get(chat_id, 0) - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                messages = self._pending[chat_id]
+                message_id = next(iter(messages))
+                text, waiters = messages.pop(message_id)
+                error = await self._send(chat_id, message_id, text)
+                self._set_next_edit(chat_id, loop.time())
+                for future in waiters:
+                    if future.done():
+                        continue
+                    if error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(None)
+        finally:
+            del self._flushers[chat_id]
+            if not self._pending.get(chat_id):
+                self._pending.pop(chat_id, None)
+
+    def _set_next_edit(self, chat_id, now):
+        if len(self._next_edit) >= SWEEP_AT:
+            # A deadline that has passed doesn't hold anything back
+            self._next_edit = {chat: t for chat, t in self._next_edit.items() if t > now}
+        self._next_edit[chat_id] = now + self._interval(chat_id)
+
+    async def _send(self, chat_id, message_id, text):
+        while True:
+            try:
+                await self.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+                return None
+            except RetryAfter as e:
+                # Telegram told us exactly how long to back off
+                logger.warning(f"Rate limited in chat {chat_id}, retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except BadRequest as e:
+                # Resumed jobs may repeat an edit they already made
+                if "not modified" in str(e).lower():
+                    return None
+                return e
+            except Exception as e:
+                return e
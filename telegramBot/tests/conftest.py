@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The bot's modules import each other by bare name, as when run from telegramBot/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# vision.py builds its OpenAI client at import time, and pipeline imports vision
+os.environ.setdefault('OPENAI_API_KEY', 'test')
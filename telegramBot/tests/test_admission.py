@@ -0,0 +1,61 @@
+import pytest
+
+import admission
+from admission import Admission, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_refills_at_its_rate_up_to_the_burst():
+    bucket = TokenBucket(rate=0.5, burst=2, now=0)
+    bucket.tokens = 0
+    assert bucket.wait() == 2.0
+    bucket.refill(1)
+    assert bucket.tokens == 0.5
+    assert bucket.wait() == 1.0
+    bucket.refill(100)
+    assert bucket.tokens == 2
+    assert bucket.wait() == 0.0
+
+
+def test_user_gets_the_burst_then_waits_for_the_rate(clock):
+    gate = Admission(user_per_minute=60, user_burst=3, chat_per_minute=600, chat_burst=100)
+    assert [gate.check(1, 1)[0] for _ in range(3)] == [0.0, 0.0, 0.0]
+    retry_after, scope, first = gate.check(1, 1)
+    assert (retry_after, scope, first) == (1.0, "user", True)
+    clock[0] += 1
+    assert gate.check(1, 1)[0] == 0.0
+
+
+def test_only_the_first_rejection_in_a_streak_warns(clock):
+    gate = Admission(user_per_minute=60, user_burst=1, chat_per_minute=600, chat_burst=100)
+    gate.check(1, 1)
+    assert [gate.check(1, 1)[2] for _ in range(3)] == [True, False, False]
+    clock[0] += 1
+    gate.check(1, 1)
+    assert gate.check(1, 1)[2] is True
+
+
+def test_rejection_spends_from_neither_bucket(clock):
+    gate = Admission(user_per_minute=60, user_burst=1, chat_per_minute=60, chat_burst=2)
+    gate.check(1, -5)
+    # User 1 is out of tokens; the chat's token must still be there for user 2
+    assert gate.check(1, -5)[1] == "user"
+    assert gate.check(2, -5)[0] == 0.0
+    assert gate.check(3, -5)[1] == "chat"
+
+
+def test_sweep_forgets_full_buckets(clock, monkeypatch):
+    monkeypatch.setattr(admission, "SWEEP_EVERY", 3)
+    gate = Admission(user_per_minute=60, user_burst=3, chat_per_minute=60, chat_burst=3)
+    gate.check(1, 1)
+    gate.check(2, 2)
+    clock[0] += 10
+    gate.check(3, 3)
+    assert set(gate._users) == {3}
+    assert set(gate._chats) == {3}
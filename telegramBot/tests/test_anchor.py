@@ -0,0 +1,48 @@
+import hashlib
+
+import pytest
+
+from anchor import MerkleTree, hash_leaf, hash_pair
+
+
+def leaves(n):
+    return [hashlib.sha256(str(i).encode()).digest() for i in range(n)]
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 5, 6, 7, 8, 9, 13, 17, 256])
+def test_every_leaf_verifies(n):
+    tree = MerkleTree(leaves(n))
+    for i, leaf in enumerate(leaves(n)):
+        assert MerkleTree.verify(leaf, tree.proof(i), tree.root)
+
+
+def test_single_leaf_root_is_the_hashed_leaf():
+    (leaf,) = leaves(1)
+    tree = MerkleTree([leaf])
+    assert tree.root == hash_leaf(leaf)
+    assert tree.proof(0) == []
+
+
+def test_odd_node_is_carried_up_without_a_sibling():
+    a, b, c = leaves(3)
+    tree = MerkleTree([a, b, c])
+    assert tree.root == hash_pair(hash_pair(hash_leaf(a), hash_leaf(b)), hash_leaf(c))
+    assert tree.proof(2) == [hash_pair(hash_leaf(a), hash_leaf(b))]
+    assert len(tree.proof(0)) == 2
+
+
+@pytest.mark.parametrize("n", [2, 5, 8])
+def test_wrong_leaf_or_root_fails(n):
+    tree = MerkleTree(leaves(n))
+    other = hashlib.sha256(b"not anchored").digest()
+    assert not MerkleTree.verify(other, tree.proof(0), tree.root)
+    assert not MerkleTree.verify(leaves(n)[0], tree.proof(0), other)
+    if n > 1:
+        assert not MerkleTree.verify(leaves(n)[0], tree.proof(1), tree.root)
+
+
+def test_internal_node_does_not_pass_as_a_leaf():
+    tree = MerkleTree(leaves(8))
+    # Without domain separation, this node plus the rest of the path proves "inclusion"
+    internal = tree.levels[1][0]
+    assert not MerkleTree.verify(internal, tree.proof(0)[1:], tree.root)
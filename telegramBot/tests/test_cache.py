@@ -0,0 +1,38 @@
+import asyncio
+
+from cache import ResultCache
+
+NEAR = "ff" * 31 + "fe"
+FAR = "00" * 32
+
+
+def test_look_alikes_are_found_and_forgotten_with_their_entry(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), max_distance=4)
+    cache.put("a", "file-a", {"entry": 1}, phash="ff" * 32)
+    sha, hit = asyncio.run(cache.get_similar(NEAR))
+    assert sha == "a" and hit["trade_data"] == {"entry": 1}
+    assert asyncio.run(cache.get_similar(FAR)) == (None, None)
+
+    cache.delete("a")
+    assert cache.index.size == 0
+    assert asyncio.run(cache.get_similar(NEAR)) == (None, None)
+    cache.close()
+
+
+def test_eviction_removes_hashes_from_the_index(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2, max_distance=4)
+    for i, key in enumerate("abc"):
+        cache.put(key, None, {"entry": i}, phash=f"{i:064x}")
+    assert cache.index.size == 2
+    assert cache.get_by_hash("a") is None
+    cache.close()
+
+
+def test_index_is_loaded_from_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path=path, max_distance=4)
+    cache.put("a", None, {"entry": 1}, phash="ff" * 32)
+    cache.close()
+    cache = ResultCache(path=path, max_distance=4)
+    assert asyncio.run(cache.get_similar(NEAR))[0] == "a"
+    cache.close()
@@ -0,0 +1,91 @@
+import asyncio
+
+from fair import FairQueue, FairSemaphore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_backlogged_key_takes_turns_with_a_quiet_one():
+    async def scenario():
+        queue = FairQueue(key=lambda item: item[0])
+        for i in range(4):
+            queue.put_nowait(("busy", i))
+        queue.put_nowait(("quiet", 0))
+        return drain(queue)
+
+    order = run(scenario())
+    assert order.index(("quiet", 0)) <= 1
+    # Within a key items stay FIFO
+    assert [i for key, i in order if key == "busy"] == [0, 1, 2, 3]
+
+
+def test_weight_gives_a_key_more_turns():
+    async def scenario():
+        queue = FairQueue(key=lambda item: item[0], weight=lambda key: 2.0 if key == "group" else 1.0)
+        for i in range(4):
+            queue.put_nowait(("group", i))
+            queue.put_nowait(("user", i))
+        return [key for key, _ in drain(queue)[:6]]
+
+    assert run(scenario()).count("group") == 4
+
+
+def test_late_key_starts_at_the_clock_not_at_zero():
+    async def scenario():
+        queue = FairQueue(key=lambda item: item[0])
+        for i in range(3):
+            queue.put_nowait(("a", i))
+        queue.get_nowait()
+        queue.get_nowait()
+        # Starting at zero, both of "b"'s items would jump the rest of "a"'s backlog
+        queue.put_nowait(("b", 0))
+        queue.put_nowait(("b", 1))
+        return drain(queue)
+
+    assert run(scenario()) == [("b", 0), ("a", 2), ("b", 1)]
+
+
+def test_semaphore_admits_waiters_fairly():
+    async def scenario():
+        sem = FairSemaphore(1)
+        order = []
+
+        async def job(key, i):
+            async with sem.slot(key):
+                order.append((key, i))
+                await asyncio.sleep(0)
+
+        await sem.acquire("holder")
+        tasks = [asyncio.create_task(job("busy", i)) for i in range(3)]
+        tasks.append(asyncio.create_task(job("quiet", 0)))
+        await asyncio.sleep(0)
+        sem.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = run(scenario())
+    assert order.index(("quiet", 0)) <= 1
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    async def scenario():
+        sem = FairSemaphore(1)
+        await sem.acquire("a")
+        waiter = asyncio.create_task(sem.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        sem.release()
+        await asyncio.wait_for(sem.acquire("c"), 1)
+        return sem._value
+
+    assert run(scenario()) == 0
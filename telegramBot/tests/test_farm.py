@@ -0,0 +1,66 @@
+import json
+import asyncio
+
+import pytest
+
+from farm import RemoteProver, WorkerLost
+from prover_client import ProverError
+
+
+class ScriptedWorker:
+    """Writer side of a farm connection that answers every job with `reply`."""
+
+    def __init__(self, reader, reply):
+        self.reader = reader
+        self.reply = reply
+
+    def write(self, data):
+        job = json.loads(data)
+        if job["type"] == "job":
+            self.reader.feed_data((json.dumps({"type": "result", "id": job["id"], **self.reply}) + "\n").encode())
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def prove(reply, trades=((100.0, 117.0, 20.0, 1),)):
+    async def scenario():
+        reader = asyncio.StreamReader()
+        remote = RemoteProver("w", reader, ScriptedWorker(reader, reply))
+        reading = asyncio.create_task(remote.run())
+        try:
+            return await remote.prove_batch([list(t) for t in trades], timeout=1), remote.closed
+        except Exception as e:
+            return e, remote.closed
+        finally:
+            reading.cancel()
+    return asyncio.run(scenario())
+
+
+def test_good_reply_comes_through():
+    result, closed = prove({"status": "ok", "results": [True], "proof_hash": "ab", "journal": "00", "receipt": None})
+    assert result == {"results": [True], "proof_hash": "ab", "journal": "00", "receipt": None}
+    assert not closed
+
+
+def test_prover_error_keeps_the_worker():
+    result, closed = prove({"status": "error", "error": "guest panicked"})
+    assert isinstance(result, ProverError)
+    assert not closed
+
+
+@pytest.mark.parametrize("reply", [
+    {"results": [True], "proof_hash": "ab"},
+    {"status": "ok", "results": [True]},
+    {"status": "ok", "results": [True], "proof_hash": 5},
+    {"status": "ok", "results": [True, False], "proof_hash": "ab"},
+    {"status": "ok", "results": ["yes"], "proof_hash": "ab"},
+    {"status": "ok", "results": [True], "proof_hash": "ab", "journal": 7},
+])
+def test_malformed_reply_drops_the_worker(reply):
+    result, closed = prove(reply)
+    assert isinstance(result, WorkerLost)
+    assert closed
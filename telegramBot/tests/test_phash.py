@@ -0,0 +1,86 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from phash import HashIndex, dhash, distance
+
+
+def random_hashes(n, bits=256, seed=3):
+    rng = random.Random(seed)
+    return [f"{rng.getrandbits(bits):064x}" for _ in range(n)]
+
+
+def flip(hash_hex, count, rng):
+    value = int(hash_hex, 16)
+    for bit in rng.sample(range(256), count):
+        value ^= 1 << bit
+    return f"{value:064x}"
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(5)
+    hashes = random_hashes(300)
+    # Near copies at every distance around the radius, plus unrelated hashes
+    hashes += [flip(h, rng.randrange(0, 20), rng) for h in hashes[:200]]
+    index = HashIndex(max_distance=12)
+    for i, h in enumerate(hashes):
+        index.add(h, str(i))
+    for query in random_hashes(5, seed=4) + hashes[:20] + [flip(h, 6, rng) for h in hashes[:20]]:
+        for radius in (0, 5, 12):
+            expected = sorted(
+                (distance(query, h), str(i)) for i, h in enumerate(hashes) if distance(query, h) <= radius
+            )
+            assert index.search(query, radius) == expected
+
+
+def test_search_is_capped_at_the_index_radius():
+    index = HashIndex(max_distance=2)
+    index.add("0" * 64, "a")
+    assert index.search(f"{0b111:064x}", 64) == []
+    assert index.search(f"{0b11:064x}") == [(2, "a")]
+
+
+def test_adding_a_key_again_replaces_its_hash():
+    index = HashIndex(max_distance=4)
+    index.add("ff" * 32, "a")
+    index.add("ff" * 32, "b")
+    index.add("00" * 32, "a")
+    assert index.size == 2
+    assert index.search("ff" * 32) == [(0, "b")]
+    assert index.search("00" * 32) == [(0, "a")]
+
+
+def test_removed_keys_are_gone():
+    index = HashIndex(max_distance=4)
+    index.add("ff" * 32, "a")
+    index.remove("a")
+    index.remove("missing")
+    assert index.size == 0
+    assert index.search("ff" * 32) == []
+    assert all(not table for table in index._tables)
+
+
+def card(text):
+    # Flat areas make every gradient bit a coin toss, so give it a backdrop like a real share card
+    image = Image.radial_gradient("L").resize((640, 400)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 40, 600, 360), outline="black", width=6)
+    draw.ellipse((80, 120, 260, 300), fill="green")
+    draw.text((320, 180), text, fill="black")
+    return image
+
+
+def encode(image, **kwargs):
+    out = io.BytesIO()
+    image.save(out, **kwargs)
+    return out.getvalue()
+
+
+def test_dhash_survives_recompression_and_resizing():
+    original = card("+123.45%")
+    reference = dhash(encode(original, format="PNG"))
+    repost = encode(original.resize((480, 300)), format="JPEG", quality=60)
+    assert distance(reference, dhash(repost)) <= 12
+    unrelated = encode(Image.new("RGB", (640, 400), "black"), format="PNG")
+    assert distance(reference, dhash(unrelated)) > 12
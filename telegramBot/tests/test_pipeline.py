@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+import messages
+import pipeline as pipeline_module
+from pipeline import JobStore, Pipeline, STAGES, retry_delay
+
+
+class FakeBot:
+    def __init__(self, get_file_errors=()):
+        self.edits = []
+        self.get_file_errors = list(get_file_errors)
+        self.get_file_calls = 0
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.edits.append(text)
+
+    async def get_file(self, file_id):
+        self.get_file_calls += 1
+        raise self.get_file_errors.pop(0)
+
+
+class StubAnchorer:
+    def __init__(self):
+        self.resyncs = 0
+
+    async def resync(self):
+        self.resyncs += 1
+
+
+class StubTracker:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    def track(self, tx_hash):
+        future = asyncio.get_running_loop().create_future()
+        if isinstance(self.outcome, Exception):
+            future.set_exception(self.outcome)
+        else:
+            future.set_result(self.outcome)
+        return future
+
+
+class StubCache:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, image_sha256):
+        self.deleted.append(image_sha256)
+
+
+@pytest.fixture
+def store():
+    store = JobStore(":memory:")
+    yield store
+    store.close()
+
+
+def make_pipeline(store, tracker=None, bot=None):
+    return Pipeline(bot or FakeBot(), store, None, StubAnchorer(), tracker, StubCache())
+
+
+def confirm_job(store):
+    job = store.create(1, 10, "file", "unique")
+    job["data"].update(verdict="verified", text="verified!", tx_hash="0xab", image_sha256="sha")
+    return job
+
+
+def test_unmined_anchor_resyncs_the_nonce_and_forgets_the_verdict(store):
+    pipeline = make_pipeline(store, StubTracker(asyncio.TimeoutError("not mined")))
+    assert asyncio.run(pipeline._confirm(confirm_job(store))) is None
+    assert pipeline.anchorer.resyncs == 1
+    assert pipeline.result_cache.deleted == ["sha"]
+    assert "send it again" in pipeline.bot.edits[-1]
+
+
+def test_mined_anchor_keeps_the_verdict(store):
+    pipeline = make_pipeline(store, StubTracker({"status": 1, "blockNumber": 7}))
+    asyncio.run(pipeline._confirm(confirm_job(store)))
+    assert pipeline.anchorer.resyncs == 0
+    assert pipeline.result_cache.deleted == []
+    assert "block 7" in pipeline.bot.edits[-1]
+
+
+def test_bad_requests_are_not_retried():
+    assert retry_delay(BadRequest("File is too big"), 1) is None
+    assert retry_delay(BadRequest("Message to edit not found"), 1) is None
+    assert retry_delay(ValueError("bug"), 1) is None
+
+
+def test_transient_errors_back_off_until_the_last_attempt(monkeypatch):
+    monkeypatch.setattr(pipeline_module, "PIPELINE_RETRY_DELAY", 5)
+    monkeypatch.setattr(pipeline_module, "PIPELINE_MAX_ATTEMPTS", 3)
+    assert [retry_delay(TimedOut(), n) for n in (1, 2, 3)] == [5, 10, None]
+    # Telegram's own wait beats our doubling
+    assert retry_delay(RetryAfter(42), 1) == 42
+
+
+def run_jobs(store, bot, jobs=(), resume=False):
+    """Push jobs through a running pipeline until none are left unfinished."""
+    async def scenario():
+        pipeline = Pipeline(bot, store, None, StubAnchorer(), None, StubCache(),
+                            workers={stage: 1 for stage in STAGES})
+        await pipeline.start()
+        try:
+            if resume:
+                await pipeline.resume()
+            for job in jobs:
+                pipeline.submit(job)
+            for _ in range(200):
+                if not store.unfinished():
+                    return
+                await asyncio.sleep(0.01)
+            raise AssertionError(f"jobs still unfinished: {store.unfinished()}")
+        finally:
+            await pipeline.stop()
+    asyncio.run(scenario())
+
+
+def test_permanent_failure_gives_up_at_once(store):
+    bot = FakeBot([BadRequest("File is too big")])
+    run_jobs(store, bot, [store.create(1, 10, "file", "unique")])
+    assert bot.get_file_calls == 1
+    assert bot.edits == [messages.ERROR_TEXT]
+
+
+def test_transient_failure_is_retried_then_given_up(store, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "PIPELINE_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(pipeline_module, "PIPELINE_MAX_ATTEMPTS", 3)
+    bot = FakeBot([NetworkError("reset"), RetryAfter(0), BadRequest("Wrong file_id")])
+    run_jobs(store, bot, [store.create(1, 10, "file", "unique")])
+    assert bot.get_file_calls == 3
+    assert bot.edits == [messages.ERROR_TEXT]
+
+
+def test_resume_picks_jobs_up_at_their_saved_stage(store):
+    job = store.create(1, 10, "file", "unique")
+    job["stage"] = "notify"
+    job["data"]["verdict"] = "busy"
+    store.save(job)
+    bot = FakeBot()
+    run_jobs(store, bot, resume=True)
+    assert bot.get_file_calls == 0
+    assert bot.edits == [messages.BUSY_TEXT]
@@ -0,0 +1,124 @@
+import math
+import random
+import struct
+from fractions import Fraction
+
+import pytest
+
+from rpc import normalize_zk_inputs, precheck_pnl, to_f32
+
+
+def f32_round(x):
+    """Round an exact Fraction to the nearest f32, ties to even, without going through a double."""
+    if x == 0:
+        return 0.0
+    sign = -1 if x < 0 else 1
+    x = abs(x)
+    exponent = x.numerator.bit_length() - x.denominator.bit_length()
+    if Fraction(2) ** exponent > x:
+        exponent -= 1
+    # 24 significant bits for normals; subnormals share the 2**-149 step
+    step = Fraction(2) ** (max(exponent, -126) - 23)
+    units, rest = divmod(x / step, 1)
+    if rest > Fraction(1, 2) or (rest == Fraction(1, 2) and units % 2):
+        units += 1
+    value = units * step
+    if value >= Fraction(2) ** 128:
+        return sign * math.inf
+    return sign * float(value)
+
+
+def guest(entry, current, pnl, lev):
+    """The guest's check with every f32 operation rounded exactly. Needs entry != 0."""
+    def op(value):
+        return Fraction(f32_round(value))
+    entry, current, pnl, lev = (Fraction(v) for v in (entry, current, pnl, lev))
+    calculated = op(op(op(op(current - entry) / entry) * 100) * lev)
+    margin = op(Fraction(to_f32(0.15)) * abs(pnl))
+    return not abs(op(pnl - calculated)) > margin
+
+
+def next_f32(x, direction):
+    bits = struct.unpack('<i', struct.pack('<f', x))[0]
+    bits += direction if x >= 0 else -direction
+    return struct.unpack('<f', struct.pack('<i', bits))[0]
+
+
+def test_matches_exact_f32_arithmetic_near_the_margin():
+    rng = random.Random(7)
+    for _ in range(500):
+        entry = to_f32(rng.uniform(0.001, 100000))
+        current = to_f32(entry * rng.uniform(0.01, 5))
+        lev = rng.choice([1, 2, 3, 5, 10, 20, 25, 50, 100, 125])
+        calculated = (current - entry) / entry * 100 * lev
+        # Claims right at either edge of the 15% margin, a few ulps either side
+        for edge in (calculated / 0.85, calculated / 1.15):
+            pnl = to_f32(edge)
+            for _ in range(4):
+                pnl = next_f32(pnl, -1)
+            for _ in range(9):
+                inputs = normalize_zk_inputs(entry, current, pnl, lev)
+                assert precheck_pnl(*inputs) == guest(*inputs), inputs
+                pnl = next_f32(pnl, 1)
+
+
+@pytest.mark.parametrize("current, pnl, beyond", [
+    # 100 -> 117 computes to exactly 17.0 and the margin on 20.0 rounds to exactly 3.0
+    (117.0, 20.0, 1),
+    # Same margin from the other side: 100 -> 123 computes to 23.0
+    (123.0, 20.0, -1),
+])
+def test_exact_margin_passes_and_one_ulp_past_fails(current, pnl, beyond):
+    assert to_f32(to_f32(0.15) * pnl) == abs(pnl - (current - 100.0))
+    assert precheck_pnl(100.0, current, pnl, 1)
+    assert guest(100.0, current, pnl, 1)
+    pnl = next_f32(pnl, beyond)
+    assert not precheck_pnl(100.0, current, pnl, 1)
+    assert not guest(100.0, current, pnl, 1)
+
+
+@pytest.mark.parametrize("current, pnl, expected", [
+    # x / 0 is inf, which can't be within any margin
+    (10.0, 50.0, False),
+    (-10.0, 50.0, False),
+    # 0 / 0 is NaN, and NaN > margin is false, so the guest lets it through
+    (0.0, 50.0, True),
+    (0.0, 0.0, True),
+])
+def test_zero_entry(current, pnl, expected):
+    assert precheck_pnl(*normalize_zk_inputs(0.0, current, pnl, 1)) is expected
+
+
+@pytest.mark.parametrize("entry, current, pnl, expected", [
+    # Zero leverage computes a zero PnL, so only a zero claim matches
+    (100.0, 120.0, 20.0, False),
+    (100.0, 120.0, 0.0, True),
+    # inf * 0 is NaN, which passes like above
+    (0.0, 10.0, 123.0, True),
+])
+def test_zero_leverage(entry, current, pnl, expected):
+    assert precheck_pnl(*normalize_zk_inputs(entry, current, pnl, 0)) is expected
+
+
+def test_lossy_inputs_compare_as_f32():
+    # 0.1 isn't an f32; the guest sees the rounded value and so must we
+    assert to_f32(0.1) != 0.1
+    assert normalize_zk_inputs(0.1, 0.2, 100.0, 1)[:2] == (to_f32(0.1), to_f32(0.2))
+
+
+@pytest.mark.parametrize("inputs", [
+    (100.0, 120.0, 20.0, 1.5),
+    (100.0, 120.0, 20.0, -1),
+    # Would pass the precheck, but the host's u32 lev can't hold it
+    (100.0, 101.0, 1e12, 1e12),
+    (100.0, 101.0, 20.0, 2**32),
+    (1e39, 120.0, 20.0, 1),
+    (100.0, math.nan, 20.0, 1),
+])
+def test_inputs_the_host_cannot_take(inputs):
+    with pytest.raises(ValueError):
+        normalize_zk_inputs(*inputs)
+
+
+def test_largest_u32_leverage_is_accepted():
+    assert normalize_zk_inputs(100.0, 101.0, 20.0, 2**32 - 1)[3] == 2**32 - 1
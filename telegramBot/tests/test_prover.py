@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from farm import WorkerLost
+from prover import ProverPool, VerifierFailed
+from prover_client import ProofRejected, ProverError, encode_journal
+
+TRADES = [(100.0, 117.0, 20.0, 1)]
+
+
+class StubWorker:
+    name = "w"
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class StubVerifier:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    async def verify(self, receipt, timeout=None):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return {"proof_hash": self.outcome}
+
+
+def honest_result():
+    journal = encode_journal([x for trade in TRADES for x in trade], [True])
+    proof_hash = hashlib.sha256(bytes.fromhex(journal)).hexdigest()
+    return {"results": [True], "proof_hash": proof_hash, "journal": journal, "receipt": "beef"}
+
+
+def check(verifier_outcome, result=None):
+    pool = ProverPool(workers=0, farm_port=0)
+    worker = StubWorker()
+    result = result or honest_result()
+    pool._verifier = StubVerifier(result["proof_hash"] if verifier_outcome == "same" else verifier_outcome)
+
+    async def scenario():
+        try:
+            await pool._check_remote(worker, "w#0", TRADES, result)
+        except Exception as e:
+            return e, worker.closed
+        return None, worker.closed
+
+    return asyncio.run(scenario())
+
+
+def test_verified_receipt_passes():
+    assert check("same") == (None, False)
+
+
+@pytest.mark.parametrize("outcome", [ProofRejected("verification failed"), "00" * 32])
+def test_rejected_receipt_drops_the_worker(outcome):
+    error, closed = check(outcome)
+    assert isinstance(error, WorkerLost)
+    assert closed
+
+
+def test_missing_receipt_drops_the_worker():
+    result = honest_result()
+    result["receipt"] = None
+    error, closed = check("same", result)
+    assert isinstance(error, WorkerLost)
+    assert closed
+
+
+@pytest.mark.parametrize("outcome", [ProverError("prover stopped"), asyncio.TimeoutError()])
+def test_broken_verifier_requeues_without_blaming_the_worker(outcome):
+    error, closed = check(outcome)
+    assert isinstance(error, VerifierFailed)
+    assert not closed
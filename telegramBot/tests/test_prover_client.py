@@ -0,0 +1,68 @@
+import hashlib
+
+import pytest
+
+from prover_client import ProverError, check_journal, decode_journal, encode_journal
+
+TRADES = [(100.0, 117.0, 20.0, 1), (0.1, 0.3, 200.0, 3)]
+
+
+def result_for(trades, results):
+    journal = encode_journal([x for trade in trades for x in trade], results)
+    return {
+        "results": results,
+        "proof_hash": hashlib.sha256(bytes.fromhex(journal)).hexdigest(),
+        "journal": journal,
+    }
+
+
+def test_journal_round_trip_keeps_f32_inputs():
+    inputs, results = decode_journal(encode_journal([0.1, 2.0], [True, False, True]))
+    assert inputs == [pytest.approx(0.1, rel=1e-7), 2.0]
+    assert inputs[0] != 0.1
+    assert results == [True, False, True]
+
+
+def test_honest_result_passes():
+    check_journal(TRADES, result_for(TRADES, [True, False]))
+
+
+def test_hash_must_match_journal():
+    result = result_for(TRADES, [True, False])
+    result["proof_hash"] = "00" * 32
+    with pytest.raises(ProverError):
+        check_journal(TRADES, result)
+
+
+def test_journal_for_other_trades_is_rejected():
+    other = [(100.0, 117.0, 20.0, 1), (0.1, 0.3, 200.0, 2)]
+    with pytest.raises(ProverError):
+        check_journal(TRADES, result_for(other, [True, False]))
+
+
+def test_results_must_match_journal():
+    result = result_for(TRADES, [True, False])
+    result["results"] = [True, True]
+    with pytest.raises(ProverError):
+        check_journal(TRADES, result)
+
+
+def with_hash(journal):
+    return {"results": [], "proof_hash": hashlib.sha256(bytes.fromhex(journal)).hexdigest(), "journal": journal}
+
+
+@pytest.mark.parametrize("result", [
+    {"results": [], "proof_hash": "", "journal": None},
+    {"results": [], "proof_hash": "", "journal": ""},
+    {"results": [], "proof_hash": "", "journal": "zz"},
+    {"results": [], "proof_hash": "", "journal": "aéa"},
+    {"results": [], "journal": "00000000" * 2},
+    {"proof_hash": with_hash("00000000" * 2)["proof_hash"], "journal": "00000000" * 2},
+    {"results": None, "proof_hash": with_hash("00000000" * 2)["proof_hash"], "journal": "00000000" * 2},
+    with_hash("0100"),
+    with_hash("02000000" + "00000000"),
+    with_hash("00000000" + "01000000" + "02000000"),
+])
+def test_malformed_results_are_rejected_as_bad_proofs(result):
+    with pytest.raises(ProverError):
+        check_journal([], result)
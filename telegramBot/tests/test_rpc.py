@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+import rlp
+from web3 import AsyncWeb3
+from web3.providers.async_base import AsyncBaseProvider
+
+import rpc
+from rpc import NonceManager, invoke_contract
+
+SENDER_PK = "0x" + "11" * 32
+CONTRACT = "0x" + "22" * 20
+ABI = [{
+    "type": "function", "name": "addProofRoot", "stateMutability": "nonpayable",
+    "inputs": [{"name": "root", "type": "bytes32"}, {"name": "leafCount", "type": "uint256"}],
+    "outputs": [],
+}]
+
+
+class StubNode(AsyncBaseProvider):
+    """Just enough of a node to sign and send txs against.
+
+    `failures` scripts what eth_sendRawTransaction does next: "down" raises
+    ConnectionError like FailoverProvider does when every endpoint fails,
+    "dropped" takes the tx but loses the reply the same way, and anything
+    else is returned as a JSON-RPC error message.
+    """
+
+    def __init__(self, failures=()):
+        super().__init__()
+        self.failures = list(failures)
+        self.pool = {}
+        self.count_requests = 0
+
+    async def make_request(self, method, params):
+        if method == "eth_chainId":
+            return {"result": hex(rpc.chain_id)}
+        if method == "eth_gasPrice":
+            return {"result": hex(10**9)}
+        if method == "eth_estimateGas":
+            return {"result": hex(100000)}
+        if method == "eth_getTransactionCount":
+            self.count_requests += 1
+            return {"result": hex(len(self.pool))}
+        if method == "eth_sendRawTransaction":
+            return self.send(bytes.fromhex(params[0][2:]))
+        raise NotImplementedError(method)
+
+    def send(self, raw):
+        failure = self.failures.pop(0) if self.failures else None
+        if failure == "down":
+            raise ConnectionError("All RPC endpoints failed, last error: HTTP 429")
+        if failure and failure != "dropped":
+            return {"error": {"code": -32000, "message": failure}}
+        nonce = int.from_bytes(rlp.decode(raw)[0], "big")
+        if self.pool.get(nonce) == raw:
+            return {"error": {"code": -32000, "message": "already known"}}
+        if nonce < len(self.pool):
+            return {"error": {"code": -32000, "message": f"nonce too low: {nonce}"}}
+        self.pool[nonce] = raw
+        if failure == "dropped":
+            raise ConnectionError("All RPC endpoints failed, last error: read timed out")
+        return {"result": "0x" + AsyncWeb3.keccak(raw).hex()[2:]}
+
+
+@pytest.fixture(autouse=True)
+def no_rebroadcast_delay(monkeypatch):
+    monkeypatch.setattr(rpc, "TX_REBROADCAST_DELAY", 0)
+
+
+def send(node, count=1):
+    async def scenario():
+        w3 = AsyncWeb3(node)
+        contract = w3.eth.contract(address=CONTRACT, abi=ABI)
+        hashes = []
+        for i in range(count):
+            try:
+                hashes.append(await invoke_contract(w3, contract, "addProofRoot", [b"\x01" * 32, i], SENDER_PK))
+            except Exception as e:
+                hashes.append(e)
+        return hashes
+    return asyncio.run(scenario())
+
+
+def test_nonces_are_handed_out_once_and_recounted_after_resync():
+    async def scenario():
+        node = StubNode()
+        node.pool = {0: b"", 1: b""}
+        nonces = NonceManager(AsyncWeb3(node), rpc.get_account(SENDER_PK).address)
+        first = await asyncio.gather(*(nonces.next() for _ in range(3)))
+        await nonces.resync()
+        return first, await nonces.next(), node.count_requests
+
+    assert asyncio.run(scenario()) == ([2, 3, 4], 2, 2)
+
+
+def test_sends_use_consecutive_nonces():
+    node = StubNode()
+    hashes = send(node, 3)
+    assert sorted(node.pool) == [0, 1, 2]
+    assert bytes(hashes[0]) == AsyncWeb3.keccak(node.pool[0])
+
+
+def test_lost_send_is_rebroadcast_with_the_same_bytes():
+    node = StubNode(failures=["down"])
+    hashes = send(node, 2)
+    assert sorted(node.pool) == [0, 1]
+    assert bytes(hashes[0]) == AsyncWeb3.keccak(node.pool[0])
+
+
+def test_rebroadcast_of_a_tx_the_node_already_has_returns_its_hash():
+    node = StubNode(failures=["dropped"])
+    hashes = send(node, 2)
+    assert sorted(node.pool) == [0, 1]
+    assert bytes(hashes[0]) == AsyncWeb3.keccak(node.pool[0])
+
+
+def test_failed_rebroadcast_gives_the_nonce_back():
+    node = StubNode(failures=["down", "down"])
+    hashes = send(node, 2)
+    assert isinstance(hashes[0], ConnectionError)
+    # Without the resync the second tx would take nonce 1 and wait behind a gap forever
+    assert list(node.pool) == [0]
+    assert bytes(hashes[1]) == AsyncWeb3.keccak(node.pool[0])
+
+
+def test_taken_nonce_is_resynced_and_retried():
+    node = StubNode()
+    send(node, 1)
+    node.failures = ["nonce too low: 1"]
+    hashes = send(node, 1)
+    assert sorted(node.pool) == [0, 1]
+    assert bytes(hashes[0]) == AsyncWeb3.keccak(node.pool[1])
+
+
+def test_other_rejections_raise_and_free_the_nonce():
+    node = StubNode(failures=["insufficient funds for gas * price + value"])
+    hashes = send(node, 2)
+    assert isinstance(hashes[0], ValueError)
+    assert list(node.pool) == [0]
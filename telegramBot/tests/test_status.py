@@ -0,0 +1,88 @@
+import asyncio
+
+from telegram.error import BadRequest, RetryAfter
+
+import status
+from status import StatusEditor
+
+
+class FakeBot:
+    def __init__(self, errors=()):
+        self.edits = []
+        self.errors = list(errors)
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.edits.append((asyncio.get_running_loop().time(), chat_id, message_id, text))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_pending_texts_collapse_to_the_newest():
+    async def scenario():
+        bot = FakeBot()
+        editor = StatusEditor(bot, private_interval=0.05)
+        first = editor.set(1, 10, "one")
+        await asyncio.sleep(0)
+        # These queue behind the first edit's interval and replace each other
+        second = editor.set(1, 10, "two")
+        third = editor.set(1, 10, "three")
+        await asyncio.gather(first, second, third)
+        return [edit[3] for edit in bot.edits]
+
+    assert run(scenario()) == ["one", "three"]
+
+
+def test_edits_in_one_chat_are_spaced_by_the_interval():
+    async def scenario():
+        bot = FakeBot()
+        editor = StatusEditor(bot, private_interval=0.05, group_interval=0.1)
+        await asyncio.gather(editor.set(1, 10, "a"), editor.set(1, 11, "b"),
+                             editor.set(-5, 12, "c"), editor.set(-5, 13, "d"))
+        return bot.edits
+
+    edits = run(scenario())
+    by_chat = {}
+    for at, chat_id, _, _ in edits:
+        by_chat.setdefault(chat_id, []).append(at)
+    assert by_chat[1][1] - by_chat[1][0] >= 0.045
+    assert by_chat[-5][1] - by_chat[-5][0] >= 0.095
+
+
+def test_retry_after_and_not_modified():
+    async def scenario():
+        bot = FakeBot([RetryAfter(0)])
+        editor = StatusEditor(bot, private_interval=0)
+        await editor.set(1, 10, "retried")
+        # A resumed job repeating an edit it already made isn't an error
+        bot.errors.append(BadRequest("Message is not modified"))
+        await editor.set(1, 10, "retried")
+        return bot.edits
+
+    assert [edit[3] for edit in run(scenario())] == ["retried"]
+
+
+def test_other_errors_reach_the_caller():
+    async def scenario():
+        editor = StatusEditor(FakeBot([BadRequest("Message to edit not found")]), private_interval=0)
+        try:
+            await editor.set(1, 10, "gone")
+        except BadRequest as e:
+            return str(e)
+
+    assert "not found" in run(scenario())
+
+
+def test_past_deadlines_are_swept(monkeypatch):
+    monkeypatch.setattr(status, "SWEEP_AT", 10)
+
+    async def scenario():
+        editor = StatusEditor(FakeBot(), private_interval=0)
+        for chat_id in range(50):
+            await editor.set(chat_id, 1, "hi")
+        return len(editor._next_edit)
+
+    assert run(scenario()) <= 10
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+from web3.providers.async_base import AsyncJSONBaseProvider
+
+logger = logging.getLogger(__name__)
+
+# Comma separated JSON-RPC endpoints for the same chain, best first.
+# A local anvil node (http://127.0.0.1:8545) works as one of them for testing.
+RPC_URLS = [url.strip() for url in os.getenv('RPC_URLS', 'https://zircuit1-testnet.p2pify.com').split(',') if url.strip()]
+# Seconds per call, for connecting and for the whole request
+RPC_CONNECT_TIMEOUT = float(os.getenv('RPC_CONNECT_TIMEOUT', '3'))
+RPC_TIMEOUT = float(os.getenv('RPC_TIMEOUT', '10'))
+# Connections kept open across all endpoints, and how long idle ones stay alive
+RPC_POOL_SIZE = int(os.getenv('RPC_POOL_SIZE', '20'))
+RPC_KEEPALIVE = float(os.getenv('RPC_KEEPALIVE', '60'))
+# Consecutive failures before an endpoint is skipped, and for how long
+RPC_FAILURE_THRESHOLD = int(os.getenv('RPC_FAILURE_THRESHOLD', '3'))
+RPC_COOLDOWN = float(os.getenv('RPC_COOLDOWN', '30'))
+
+# Weight of the newest sample in an endpoint's latency average
+LATENCY_ALPHA = 0.3
+
+
+class EndpointError(Exception):
+    """Raised when an endpoint answers with a status we should fail over on."""
+
+
+class Endpoint:
+    """One RPC URL with its smoothed latency and circuit breaker state."""
+
+    def __init__(self, url, failure_threshold=RPC_FAILURE_THRESHOLD, cooldown=RPC_COOLDOWN):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency = None
+        self.failures = 0
+        self.open_until = 0
+
+    def available(self, now):
+        # Once the cooldown passes the breaker is half open and lets a call through
+        return now >= self.open_until
+
+    def record_success(self, latency):
+        self.failures = 0
+        self.open_until = 0
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self.latency
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.open_until = now + self.cooldown
+            logger.warning(f"RPC endpoint {self.url} failed {self.failures} times, skipping it for {self.cooldown}s")
+
+
+class FailoverProvider(AsyncJSONBaseProvider):
+    """Async web3 provider over a pooled keep-alive session and a ranked endpoint list.
+
+    Each call goes to the fastest endpoint whose circuit breaker is closed and
+    falls through to the next one on timeouts, connection errors, 429s and 5xx.
+    """
+
+    def __init__(self, urls=None, timeout=RPC_TIMEOUT, connect_timeout=RPC_CONNECT_TIMEOUT,
+                 pool_size=RPC_POOL_SIZE, keepalive=RPC_KEEPALIVE):
+        super().__init__()
+        self.endpoints = [Endpoint(url) for url in (urls or RPC_URLS)]
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Content-Type": "application/json"},
+            )
+        return self._session
+
+    def ranked(self):
+        """Endpoints to try, fastest healthy ones first, then the ones closest to recovering."""
+        now = time.monotonic()
+        order = {endpoint: i for i, endpoint in enumerate(self.endpoints)}
+        healthy = [e for e in self.endpoints if e.available(now)]
+        # Untried endpoints rank by configured order, ahead of slower measured ones
+        healthy.sort(key=lambda e: (e.latency if e.latency is not None else 0, order[e]))
+        tripped = sorted((e for e in self.endpoints if not e.available(now)), key=lambda e: e.open_until)
+        return healthy + tripped
+
+    async def post(self, payload: bytes) -> bytes:
+        """Send a raw JSON-RPC payload, failing over across endpoints."""
+        session = self._get_session()
+        last_error = None
+        for endpoint in self.ranked():
+            start = time.monotonic()
+            try:
+                async with session.post(endpoint.url, data=payload) as response:
+                    if response.status == 429 or response.status >= 500:
+                        raise EndpointError(f"HTTP {response.status}")
+                    response.raise_for_status()
+                    body = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError, EndpointError) as e:
+                endpoint.record_failure(time.monotonic())
+                logger.warning(f"RPC call to {endpoint.url} failed: {str(e) or type(e).__name__}")
+                last_error = e
+                continue
+            endpoint.record_success(time.monotonic() - start)
+            return body
+        raise ConnectionError(f"All RPC endpoints failed, last error: {last_error}")
+
+    async def make_request(self, method, params):
+        payload = self.encode_rpc_request(method, params)
+        return self.decode_rpc_response(await self.post(payload))
+
+    async def make_batch_request(self, requests):
+        """Send several (method, params) calls as one JSON-RPC batch.
+
+        Returns the response objects in the same order as the requests.
+        """
+        encoded = [self.encode_rpc_request(method, params) for method, params in requests]
+        ids = [json.loads(request)["id"] for request in encoded]
+        body = json.loads(await self.post(b"[" + b",".join(encoded) + b"]"))
+        if not isinstance(body, list):
+            # Some nodes answer an unsupported batch with a single error object
+            raise EndpointError(f"Batch request rejected: {body}")
+        by_id = {response.get("id"): response for response in body}
+        return [
+            by_id.get(request_id, {"error": {"message": "missing from batch response"}})
+            for request_id in ids
+        ]
+
+    async def is_connected(self, show_traceback=False):
+        try:
+            response = await self.make_request("web3_clientVersion", [])
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+        return "error" not in response
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
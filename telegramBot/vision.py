@@ -0,0 +1,150 @@
+import os
+import json
+import base64
+import time
+import random
+import asyncio
+import logging
+from typing import Dict
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+from imaging import prepare_image, VISION_DETAIL
+from fair import FairSemaphore
+import ocr
+import metrics
+
+logger = logging.getLogger(__name__)
+
+VISION_MODEL = os.getenv('VISION_MODEL', 'gpt-4o-mini')
+# Seconds to wait for a connection / for the model to answer
+VISION_CONNECT_TIMEOUT = float(os.getenv('VISION_CONNECT_TIMEOUT', '5'))
+VISION_READ_TIMEOUT = float(os.getenv('VISION_READ_TIMEOUT', '60'))
+# How many times to retry on 429s, 5xx and dropped connections
+VISION_MAX_RETRIES = int(os.getenv('VISION_MAX_RETRIES', '3'))
+VISION_BACKOFF_BASE = float(os.getenv('VISION_BACKOFF_BASE', '0.5'))
+VISION_BACKOFF_MAX = float(os.getenv('VISION_BACKOFF_MAX', '8'))
+# Vision requests allowed in flight at once
+VISION_CONCURRENCY = int(os.getenv('VISION_CONCURRENCY', '8'))
+
+PROMPT = """Analyze this trading chart image and extract the following information in JSON format only:
+        - entry price
+        - exit price
+        - percentage gain/loss
+        - leverage
+
+        Return ONLY the JSON object with these fields, nothing else. Example format:
+        {"entry": 100.5, "exit": 120.3, "percentage": 19.7, "leverage": 80}
+
+        REMEMBER: if you dont see any long position with leverage 80X then we put in the value of 80 otherwise just use 1 if leverage is not used.
+        """
+
+# One pooled HTTP client shared by every request so connections get reused
+http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(VISION_READ_TIMEOUT, connect=VISION_CONNECT_TIMEOUT),
+    limits=httpx.Limits(
+        max_connections=VISION_CONCURRENCY,
+        max_keepalive_connections=VISION_CONCURRENCY,
+    ),
+)
+
+# Retries are handled below so we control the backoff
+client = AsyncOpenAI(
+    api_key=os.getenv('OPENAI_API_KEY'),
+    http_client=http_client,
+    max_retries=0,
+)
+
+# Slots are handed out fairly across chats, so one busy chat can't hold them all
+_slots = FairSemaphore(VISION_CONCURRENCY)
+
+def _should_retry(e: Exception) -> bool:
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    # Covers timeouts as well
+    return isinstance(e, APIConnectionError)
+
+def _backoff(attempt: int) -> float:
+    # Full jitter so a burst of 429s doesn't retry in lockstep
+    return random.uniform(0, min(VISION_BACKOFF_MAX, VISION_BACKOFF_BASE * 2 ** attempt))
+
+async def _create_completion(image_bytes: bytes, key=None):
+    # Decoding and resizing is CPU work, keep it off the event loop
+    image_bytes, mime = await asyncio.to_thread(prepare_image, image_bytes)
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": PROMPT},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{mime};base64,{base64.b64encode(image_bytes).decode('utf-8')}",
+                        "detail": VISION_DETAIL
+                    }
+                }
+            ]
+        }
+    ]
+    attempt = 0
+    while True:
+        try:
+            async with _slots.slot(key):
+                return await client.chat.completions.create(
+                    model=VISION_MODEL,
+                    messages=messages,
+                    max_tokens=300
+                )
+        except Exception as e:
+            if attempt >= VISION_MAX_RETRIES or not _should_retry(e):
+                raise
+            delay = _backoff(attempt)
+            attempt += 1
+            logger.warning(f"Vision API error ({str(e)}), retry {attempt}/{VISION_MAX_RETRIES} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+async def analyze_pnl_image(image_bytes: bytes, key=None) -> Dict:
+    """Analyze PNL image, locally for known exchange cards and with GPT-4 Vision otherwise.
+
+    `key` (the chat) is what vision slots are shared fairly between.
+    """
+    try:
+        trade_data = await asyncio.to_thread(ocr.extract_trade_data, image_bytes)
+        if trade_data:
+            metrics.EXTRACTIONS.labels("ocr").inc()
+            return trade_data
+
+        started = time.monotonic()
+        response = await _create_completion(image_bytes, key)
+        metrics.OPENAI_SECONDS.observe(time.monotonic() - started)
+        if response.usage:
+            metrics.OPENAI_TOKENS.labels("prompt").inc(response.usage.prompt_tokens)
+            metrics.OPENAI_TOKENS.labels("completion").inc(response.usage.completion_tokens)
+
+        # Process the response
+        content = response.choices[0].message.content.strip()
+
+        # Remove any markdown formatting
+        content = content.replace('```json', '').replace('```', '').strip()
+
+        # Parse JSON response
+        trade_data = json.loads(content)
+        logger.info(f"Successfully extracted trade data: {trade_data}")
+
+        # Validate all required fields are present
+        required_fields = ['entry', 'exit', 'percentage', 'leverage']
+        if not all(field in trade_data for field in required_fields):
+            logger.error("Missing required fields in trade data")
+            metrics.EXTRACTIONS.labels("failed").inc()
+            return None
+
+        metrics.EXTRACTIONS.labels("vision").inc()
+        return trade_data
+
+    except Exception as e:
+        logger.error(f"Error analyzing image: {str(e)}")
+        metrics.EXTRACTIONS.labels("failed").inc()
+        return None
+
+async def close():
+    """Close the pooled HTTP client."""
+    await http_client.aclose()
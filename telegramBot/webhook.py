@@ -0,0 +1,84 @@
+import os
+import hmac
+import signal
+import asyncio
+import logging
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Address and path the embedded server listens on. TLS is left to the load
+# balancer or reverse proxy in front of it.
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Telegram sends this back in X-Telegram-Bot-Api-Secret-Token on every call
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Public URL Telegram should call. When set, this replica registers the webhook on
+# startup; with several replicas behind one endpoint, setting it on one is enough.
+# Replicas also each need their own SENDER_PK, or their nonces collide.
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+# Concurrent connections Telegram may open to us (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def create_app(application, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    """aiohttp app that validates webhook calls and queues their updates."""
+
+    async def receive(request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except (ValueError, TypeError, AttributeError):
+            return web.Response(status=400)
+        # The Application processes its queue in the background, so Telegram
+        # gets its 200 without waiting on any handler
+        application.update_queue.put_nowait(update)
+        return web.Response()
+
+    async def health(request):
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post(path, receive)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+async def serve(application, post_init, post_shutdown, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT):
+    """Run the bot on the webhook server until SIGINT or SIGTERM."""
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET must be set in webhook mode")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    await post_init(application)
+    await application.start()
+    if WEBHOOK_URL:
+        await application.bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info(f"Registered webhook {WEBHOOK_URL}")
+
+    runner = web.AppRunner(create_app(application), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, listen, port).start()
+    logger.info(f"Listening for webhook calls on {listen}:{port}{WEBHOOK_PATH}")
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await application.stop()
+        await application.shutdown()
+        await post_shutdown(application)